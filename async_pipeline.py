@@ -0,0 +1,183 @@
+# async_pipeline.py
+#
+# run_all.py with the reading pulled out of the parsers: an asyncio loop reads
+# each input once (on a small thread pool, so slow network shares overlap with
+# parsing), hashes the buffer for the manifest and hands it to a process pool
+# that parses it from memory. Inputs of MMAP_BYTES or more are not copied into
+# the parent; the worker memory-maps them instead.
+#
+#   python async_pipeline.py                      # every input folder, like run_all.py
+#   python async_pipeline.py --retailer cb --force
+#
+# Orders that never touch the disk (an email attachment, an SFTP download)
+# go through parse_bytes:
+#
+#   result = await parse_bytes("lotte", "LOTTE 10.07.xls", data, path_config)
+
+import io
+import os
+import sys
+import mmap
+import time
+import asyncio
+import hashlib
+import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import run_all
+from manifest import Manifest
+
+MMAP_BYTES = 8 * 1024 * 1024
+READ_THREADS = 4
+
+# A large input the worker maps itself instead of receiving its bytes over the pool's pipe
+MappedFile = namedtuple("MappedFile", ["path"])
+
+class MappedReader(io.RawIOBase):
+    """Seekable binary file object over a mmap, for readers (zipfile, pdfplumber) that need one.
+
+    Reads copy only the requested range; the file itself is never loaded whole.
+    """
+
+    def __init__(self, mapped):
+        self.mapped = mapped
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = max(0, min(len(buffer), len(self.mapped) - self.pos))
+        buffer[:n] = self.mapped[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.pos, io.SEEK_END: len(self.mapped)}[whence]
+        self.pos = max(0, base + offset)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+def load_input(path, mmap_bytes=MMAP_BYTES):
+    """(source, fingerprint) for one input file, reading it exactly once. The fingerprint is
+    the manifest's size, mtime and sha256, stat'ed before the read."""
+    st = os.stat(path)
+    if st.st_size >= mmap_bytes:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            # Hashing through the map leaves the pages cached for the worker's own map
+            source, digest = MappedFile(path), hashlib.sha256(m).hexdigest()
+    else:
+        with open(path, "rb") as f:
+            source = f.read()
+        digest = hashlib.sha256(source).hexdigest()
+    return source, {"size": st.st_size, "mtime": st.st_mtime, "sha256": digest}
+
+def parse_source(retailer, name, source, path_config):
+    """Worker entry point: parse one in-memory input (bytes or a MappedFile)."""
+    if not isinstance(source, MappedFile):
+        return run_all.run_one(retailer, name, path_config, source=source)
+    with open(source.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        # Parsers that need plain bytes read() the whole file; the rest seek around in the map
+        return run_all.run_one(retailer, name, path_config, source=io.BufferedReader(MappedReader(m)))
+
+def error_result(retailer, file_path, e):
+    return {
+        "retailer": retailer,
+        "file": file_path,
+        "status": "error",
+        "seconds": None,
+        "outputs": [],
+        "error": f"{type(e).__name__}: {e}",
+    }
+
+async def parse_bytes(retailer, name, data, path_config, executor=None):
+    """Parse an input that only exists in memory; name is its file name (delivery date, order type)."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, parse_source, retailer, name, data, path_config)
+
+async def run_pipeline(path_config, workers=None, retailers=None, force=False):
+    """Same jobs, manifest and results as run_all.run_all, with each input read once up front."""
+    jobs = run_all.discover_inputs(path_config, retailers)
+    unrecognised = []
+    run_all.discover_inbox(path_config, unrecognised=unrecognised)
+    for c in unrecognised:
+        print(f"[SKIP] inbox/{os.path.basename(c.path)}: {c.reason}")
+    if not jobs:
+        print("No input files found.")
+        return []
+
+    manifest = Manifest(path_config.get("manifest", "output/manifest.json"))
+    hashes = {retailer: run_all.retailer_config_hash(retailer) for retailer, _ in jobs}
+    if not force:
+        jobs, skipped = run_all.filter_changed(jobs, manifest, hashes)
+        if skipped:
+            print(f"Skipping {skipped} unchanged files")
+    if not jobs:
+        manifest.save()
+        return []
+
+    workers = workers or os.cpu_count() or 1
+    loop = asyncio.get_running_loop()
+    # At most two buffers per worker in memory: the one being parsed and the next one, read ahead
+    buffered = asyncio.Semaphore(workers * 2)
+
+    async def handle(retailer, file_path, pool, readers):
+        async with buffered:
+            try:
+                source, fingerprint = await loop.run_in_executor(readers, load_input, file_path)
+            except OSError as e:
+                result = error_result(retailer, file_path, e)
+            else:
+                try:
+                    result = await parse_bytes(retailer, file_path, source, path_config, pool)
+                except Exception as e:
+                    # Worker died (e.g. killed by the OS) before it could report back
+                    result = error_result(retailer, file_path, e)
+        if result["status"] != "error":
+            manifest.record(file_path, retailer, run_all.parser_version(retailer),
+                            hashes[retailer], result["outputs"], fingerprint)
+        else:
+            manifest.forget(file_path)
+        print(f"[{result['status'].upper()}] {retailer}/{os.path.basename(file_path)} "
+              f"({result['seconds']}s)")
+        return result
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, \
+            ThreadPoolExecutor(max_workers=READ_THREADS, thread_name_prefix="read") as readers:
+        results = await asyncio.gather(*(handle(r, p, pool, readers) for r, p in jobs))
+
+    manifest.prune()
+    manifest.save()
+    return list(results)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read every input once and parse it from memory.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--retailer", action="append", choices=sorted(run_all.RETAILERS),
+                        help="Only process this retailer (repeatable)")
+    parser.add_argument("--paths", default="config/paths.json", help="Path config file")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-parse every input even if the manifest says it is current")
+    parser.add_argument("--report", default="output/run_report.json",
+                        help="Where to write the per-file timing/failure report")
+    args = parser.parse_args(argv)
+
+    path_config = run_all.load_path_config(args.paths)
+    start = time.perf_counter()
+    results = asyncio.run(run_pipeline(path_config, workers=args.workers, retailers=args.retailer,
+                                       force=args.force))
+    wall_time = time.perf_counter() - start
+
+    run_all.write_report(results, args.report)
+    run_all.print_summary(results, wall_time)
+    return 1 if any(r["status"] == "error" for r in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
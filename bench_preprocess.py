@@ -0,0 +1,86 @@
+# bench_preprocess.py
+#
+# Compares the old allocate-per-step preprocess_image_for_ocr with
+# ocr_preprocess.Preprocessor on the Co.op screenshots (tiled vertically to
+# simulate tall orders): time per image and allocated bytes per image in
+# steady state, and checks both produce identical threshold images.
+#
+#   python bench_preprocess.py --repeat 20 --stack 1 4 16
+
+import sys
+import glob
+import time
+import argparse
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from ocr_preprocess import Preprocessor, load_image
+
+def legacy_preprocess(image):
+    # The old code wrote into the freshly decoded image; copy so repeats start clean
+    image = image.copy()
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    lower_red1 = np.array([0, 50, 50])
+    upper_red1 = np.array([10, 255, 255])
+    lower_red2 = np.array([160, 50, 50])
+    upper_red2 = np.array([180, 255, 255])
+    red_mask = cv2.inRange(hsv, lower_red1, upper_red1) | cv2.inRange(hsv, lower_red2, upper_red2)
+    image[red_mask > 0] = [0, 0, 0]
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    blur = cv2.GaussianBlur(gray, (3, 3), 0)
+    sharp = cv2.addWeighted(gray, 1.5, blur, -0.5, 0)
+    return cv2.adaptiveThreshold(sharp, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                 cv2.THRESH_BINARY, 11, 2)
+
+def measure(fn, images, repeat):
+    """Best seconds per image over repeat passes, and bytes allocated per image in a warm pass."""
+    for image in images:
+        fn(image)
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for image in images:
+            fn(image)
+        best = min(best, (time.perf_counter() - start) / len(images))
+
+    tracemalloc.start()
+    for image in images:
+        fn(image)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark OCR preprocessing.")
+    parser.add_argument("--images", default="input/coop/*.jpg")
+    parser.add_argument("--stack", type=int, nargs="+", default=[1, 4, 16],
+                        help="Stack each screenshot this many times vertically")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    sources = sorted(glob.glob(args.images))
+    if not sources:
+        print(f"No images match {args.images}")
+        return 1
+    base = [load_image(s) for s in sources]
+
+    print(f"{'stack':>5} {'legacy ms':>10} {'buffered ms':>12} {'speedup':>8} "
+          f"{'legacy peak KB':>15} {'buffered peak KB':>17}  identical")
+    for n in args.stack:
+        images = [np.vstack([img] * n) for img in base]
+        pre = Preprocessor()
+        identical = all(np.array_equal(legacy_preprocess(img), pre.run(img)) for img in images)
+
+        old_t, old_peak = measure(legacy_preprocess, images, args.repeat)
+        new_t, new_peak = measure(pre.run, images, args.repeat)
+        print(f"{n:>5} {old_t * 1000:>10.2f} {new_t * 1000:>12.2f} {old_t / new_t:>7.1f}x "
+              f"{old_peak / 1024:>15.0f} {new_peak / 1024:>17.0f}  {identical}")
+        if not identical:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
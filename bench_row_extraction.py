@@ -0,0 +1,96 @@
+# bench_row_extraction.py
+#
+# Compares the old df.iterrows() row loop from parse_cb/parse_smile_cheers with
+# excel_reader.normalise_rows on synthetic sheets, and checks that both produce
+# byte-identical JSON (the new OrderRows as written by order_rows.write_record).
+#
+#   python bench_row_extraction.py --rows 1000 10000 100000
+
+import io
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from excel_reader import normalise_rows
+from order_rows import write_record
+
+PRODUCT, QTY, PRICE = "TEN HANG", "LƯỢNG NCC", "DON GIA"
+
+def legacy_rows(df, product_col, qty_col, unit_price_col, tax):
+    rows = []
+    for _, row in df.iterrows():
+        product_name = str(row.get(product_col)).strip()
+        if not product_name or product_name.lower() in ['nan', 'tổng cộng']:
+            continue
+        try:
+            qty = float(row[qty_col])
+        except (ValueError, TypeError):
+            continue
+        unit_price = None
+        if unit_price_col and unit_price_col in df.columns:
+            try:
+                unit_price = float(row[unit_price_col])
+            except (ValueError, TypeError):
+                unit_price = None
+        rows.append({
+            "product_name": product_name,
+            "qty": qty,
+            "unit_price": unit_price,
+            "tax": tax
+        })
+    return rows
+
+def synthetic_sheet(n_rows, seed=0):
+    """A CB-like sheet with the noise real files have: blanks, totals rows, text in number columns."""
+    rng = np.random.default_rng(seed)
+    names = np.array([f"Rau cai {i % 500} 300g" for i in range(n_rows)], dtype=object)
+    names[rng.random(n_rows) < 0.05] = np.nan
+    names[rng.random(n_rows) < 0.01] = "Tổng cộng"
+
+    qty = rng.integers(0, 200, n_rows).astype(object)
+    qty[rng.random(n_rows) < 0.05] = np.nan
+    qty[rng.random(n_rows) < 0.02] = "x"
+
+    price = (rng.integers(5, 60, n_rows) * 500).astype(object)
+    price[rng.random(n_rows) < 0.05] = "liên hệ"
+
+    extra = {f"COL{i}": rng.random(n_rows) for i in range(12)}
+    return pd.DataFrame({"STT": np.arange(n_rows), PRODUCT: names, QTY: qty, PRICE: price, **extra})
+
+def written_json(rows):
+    f = io.StringIO()
+    write_record(f, {"rows": rows})
+    return f.getvalue()
+
+def best_of(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark iterrows vs vectorised row extraction.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>8} {'iterrows (s)':>14} {'vectorised (s)':>15} {'speedup':>8}  identical")
+    for n in args.rows:
+        df = synthetic_sheet(n)
+        old_t, old_rows = best_of(lambda: legacy_rows(df, PRODUCT, QTY, PRICE, 0), args.repeat)
+        new_t, new_rows = best_of(lambda: normalise_rows(df, PRODUCT, QTY, PRICE, 0), args.repeat)
+        identical = json.dumps({"rows": old_rows}, ensure_ascii=False, indent=2) == written_json(new_rows)
+        print(f"{n:>8} {old_t:>14.4f} {new_t:>15.4f} {old_t / new_t:>7.1f}x  {identical}")
+        if not identical:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,568 @@
+# benchmark.py
+#
+# Throughput harness for every retailer parser. Generates synthetic inputs in
+# each real layout, runs them through the parsers' own entry points (the same
+# ones run_all.py calls) and reports per-stage time, rows/sec, p50/p95 seconds
+# per file and peak RSS, optionally against a stored baseline.
+#
+#   python benchmark.py --files 20 --rows 200
+#   python benchmark.py --save-baseline output/benchmark/baseline.json
+#   python benchmark.py --baseline output/benchmark/baseline.json   # exit 1 on regression
+#   python benchmark.py --retailer coop --ocr-backend pytesseract    # OCR images/s per backend
+#
+# Each retailer runs in its own fresh process so peak RSS is per retailer.
+
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import argparse
+import contextlib
+import resource
+import tempfile
+import importlib
+import multiprocessing
+from datetime import datetime, timedelta
+
+import run_all
+
+RETAILERS = ["cb", "satra", "smile_cheers", "lotte", "mini", "genshai", "coop"]
+
+PRODUCTS = [
+    "Cai thia 300g", "Cai ngot 300g", "Cai be xanh 300g", "Cai bo xoi 300g", "Dua leo 300g",
+    "Dua leo baby 500g", "Ca chua Beef 500g", "Bap cai thao kg", "Bong cai xanh kg", "Dau bap 250g",
+    "Kho qua 500g", "Bi dao trai", "Rau muong 300g", "Xa lach lo lo xanh 300g", "Su hao 400g",
+    "Khoai lang Nhat 1kg", "Ca tim 500g", "Bau trai", "Su su 300g", "Dau cove 300g",
+]
+
+# Functions each parser calls, timed as stages: (module, attribute, stage).
+# Stage time is exclusive, so a stage called inside another is not counted twice.
+STAGES = {
+    "cb": [("parse_cb", "read_sheet", "open"), ("parse_cb", "rows_to_frame", "extract"),
+           ("parse_cb", "normalise_rows", "normalise"), ("parse_cb", "save_records", "write")],
+    "smile_cheers": [("parse_smile_cheers", "read_sheet", "open"),
+                     ("parse_smile_cheers", "rows_to_frame", "extract"),
+                     ("parse_smile_cheers", "normalise_rows", "normalise"),
+                     ("parse_smile_cheers", "save_records", "write")],
+    "satra": [("parse_satra", "read_sheet", "open"), ("parse_satra", "warehouse_records", "normalise"),
+              ("parse_satra", "save_records", "write")],
+    # Lotte slips are parsed while save_records consumes them, so both land in one stage
+    "lotte": [("parse_lotte", "save_records", "extract+write")],
+    "mini": [("parse_mini", "fast_text", "extract"), ("parse_mini", "iter_pdf_text", "layout"),
+             ("parse_mini", "parse_pages", "normalise"), ("parse_mini", "save_records", "write")],
+    "genshai": [("parse_genshai", "fast_first_page_text", "extract"),
+                ("parse_genshai", "iter_pdf_pages", "layout"),
+                ("parse_genshai", "parse_table_rows", "normalise"),
+                ("parse_genshai", "save_records", "write")],
+    "coop": [("parse_coop_image", "preprocess_image_for_ocr", "preprocess"),
+             ("parse_coop_image", "ocr_image", "ocr"),
+             ("parse_coop_image", "parse_line_text", "normalise"),
+             ("parse_coop_image", "save_records", "write")],
+}
+
+# ---------------------------------------------------------------- generators
+
+def order_lines(rng, n_rows):
+    return [(rng.choice(PRODUCTS), rng.randint(1, 150), rng.randint(10, 60) * 500) for _ in range(n_rows)]
+
+def gen_cb(path, rng, n_rows, day):
+    from openpyxl import Workbook
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "C.BAC-21204"
+    ws["A1"] = "BANG PHAN CHIA THUC TE"
+    ws["A3"] = "NCC: 21204"
+    ws.append([])
+    ws.append([])
+    ws.append([])
+    ws.cell(row=7, column=1, value="STT")
+    for col, title in enumerate(["TEN HANG", "DVT", "LƯỢNG NCC", "TONG LUONG", "DON GIA"], start=2):
+        ws.cell(row=7, column=col, value=title)
+    for i, (name, qty, price) in enumerate(order_lines(rng, n_rows), start=1):
+        ws.append([i, name, "Goi", qty, qty, price])
+    ws.append([None, "Tổng cộng", None, None, None, None])
+    wb.save(path)
+
+def gen_smile_cheers(path, rng, n_rows, day):
+    from openpyxl import Workbook
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "C.BAC-21204"
+    ws["A1"] = "DON DAT HANG SMILE CHEERS"
+    ws["G4"] = datetime.combine(day, datetime.min.time())
+    for col, title in enumerate(["STT", "TÊN HÀNG", "ĐVT", "TỔNG", "ĐG"], start=1):
+        ws.cell(row=5, column=col, value=title)
+    for i, (name, qty, price) in enumerate(order_lines(rng, n_rows), start=1):
+        ws.append([i, name, "Goi", qty, price])
+    wb.save(path)
+
+def gen_satra(path, rng, n_rows, day):
+    from openpyxl import Workbook
+    wb = Workbook()
+    ws = wb.active
+    ws["A1"] = "SATRA - DON DAT HANG"
+    ws["F7"] = day.strftime("%d.%m.%Y")
+    ws["E11"], ws["K11"], ws["M11"] = "TÊN HÀNG", "PVT", "TN"
+    for i, (name, qty, _) in enumerate(order_lines(rng, n_rows)):
+        row = 12 + i
+        ws.cell(row=row, column=1, value=i + 1)
+        ws.cell(row=row, column=5, value=f"RL-{name.upper()}")
+        ws.cell(row=row, column=11, value=qty)
+        ws.cell(row=row, column=13, value=rng.randint(1, 80))
+    wb.save(path)
+
+def lotte_rows(rng, n_rows, day):
+    """Slip blocks of 1-8 lines: slip number in E, date in M on the slip's first row, lines in U/AA-AC."""
+    rows = []
+    slip = 0
+    while len(rows) < n_rows:
+        slip += 1
+        for line in range(rng.randint(1, 8)):
+            row = [None] * 29
+            if line == 0:
+                row[4] = f"{day:%y%m%d}-01012-{slip:05d}"
+                row[12] = day.strftime("%d/%m/%Y")
+            name, qty, price = rng.choice(PRODUCTS).upper(), rng.randint(1, 150), rng.randint(10, 60) * 500
+            row[20], row[26], row[27], row[28] = name, f"{price:,}", "0", str(qty)
+            rows.append(row)
+    return rows[:n_rows]
+
+def gen_lotte(path, rng, n_rows, day):
+    rows = lotte_rows(rng, n_rows, day)
+    if path.endswith(".xls"):
+        import xlwt
+        wb = xlwt.Workbook()
+        ws = wb.add_sheet("Sheet1")
+        for r, row in enumerate(rows, start=4):
+            for c, value in enumerate(row):
+                if value is not None:
+                    ws.write(r, c, value)
+        wb.save(path)
+        return
+    from openpyxl import Workbook
+    wb = Workbook()
+    ws = wb.active
+    for _ in range(4):
+        ws.append([])
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+
+def pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def pdf_text(x, y, size, text):
+    return f"BT /F1 {size} Tf {x:.1f} {y:.1f} Td ({pdf_escape(text)}) Tj ET"
+
+def write_pdf(path, pages, width=595, height=842):
+    """Minimal PDF: one Helvetica (WinAnsi) font, one content stream per page."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    kids = []
+    for content in pages:
+        stream = content.encode("cp1252")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(("<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources << /Font << /F1 3 0 R >> >> "
+                        "/Contents %d 0 R >>" % (width, height, len(objects))).encode())
+        kids.append(len(objects))
+    objects[1] = ("<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{k} 0 R" for k in kids), len(kids))).encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+def gen_mini(path, rng, n_rows, day, per_page=45):
+    lines = [(3500000 + rng.randint(0, 99999), f"F-{name}-DXF", price, qty)
+             for name, qty, price in order_lines(rng, n_rows)]
+    chunks = [lines[i:i + per_page] for i in range(0, len(lines), per_page)] or [[]]
+    pages = []
+    for page_no, chunk in enumerate(chunks):
+        ops = []
+        y = 800
+        header = ["SAIGON CO.OP", "Store Ha Do", "VENDOR 21223 NCC 9-DONG XANH FOOD",
+                  "SKU TEN HANG DVT GIA VON LUONG DAT TONG TIEN"]
+        for text in (header if page_no == 0 else header[-1:]):
+            ops.append(pdf_text(40, y, 9, text))
+            y -= 14
+        for sku, name, price, qty in chunk:
+            ops.append(pdf_text(40, y, 9, f"{sku} {name} EA {price:,} {qty} {price * qty:,}"))
+            y -= 14
+        if page_no == len(chunks) - 1:
+            total_qty = sum(qty for *_, qty in lines)
+            total = sum(price * qty for _, _, price, qty in lines)
+            ops.append(pdf_text(40, y, 9, f"Grand Total {total_qty} {total:,}"))
+            ops.append(pdf_text(40, y - 14, 9, f"{day.day}-{day.month}-{day.year}"))
+        pages.append("\n".join(ops))
+    write_pdf(path, pages)
+
+GENSHAI_HEADER = ["STT", "Ma VT", "Ma hang", "Ten hang hoa", "DVT", "So luong", "Don gia", "TT chua CK",
+                  "CK DH", "Tien CK", "CK Khac", "Tien CK K", "TT da CK", "Thue GTGT", "Tien thue", "Thanh tien"]
+
+def gen_genshai(path, rng, n_rows, day, per_page=30):
+    widths = [24, 48, 58, 110] + [40] * 12
+    xs = [20]
+    for w in widths:
+        xs.append(xs[-1] + w)
+    rows = []
+    for i, (name, qty, price) in enumerate(order_lines(rng, n_rows), start=1):
+        amount = qty * price
+        tax = amount * 5 // 100
+        rows.append([f"{i}.00", "CODE", f"8936180{i:06d}", name, "Goi", f"{qty}.00", f"{price:,}.00",
+                     f"{amount:,}.00", "0.000", "0.00", "", "", f"{amount:,}.00", "5.00",
+                     f"{tax:,}.00", f"{amount + tax:,}.00"])
+
+    chunks = [rows[i:i + per_page] for i in range(0, len(rows), per_page)] or [[]]
+    pages = []
+    for page_no, chunk in enumerate(chunks):
+        ops = []
+        top = 540
+        if page_no == 0:
+            ops.append(pdf_text(20, 570, 9, f"Ngày giao hàng: {day.month}/{day.day}/{day.year} 12:48:22 PM"))
+        table = [GENSHAI_HEADER] + chunk
+        height = 14
+        bottom = top - height * len(table)
+        for r in range(len(table) + 1):
+            y = top - r * height
+            ops.append(f"{xs[0]} {y} m {xs[-1]} {y} l S")
+        for x in xs:
+            ops.append(f"{x} {top} m {x} {bottom} l S")
+        for r, row in enumerate(table):
+            for c, value in enumerate(row):
+                if value:
+                    ops.append(pdf_text(xs[c] + 2, top - (r + 1) * height + 4, 6, value))
+        pages.append("\n".join(ops))
+    write_pdf(path, pages, width=842, height=595)
+
+def gen_coop(path, rng, n_rows, day):
+    import cv2
+    import numpy as np
+    height = 40 + 30 * n_rows
+    image = np.full((height, 900, 3), 255, dtype=np.uint8)
+    cv2.putText(image, "TEN HANG          GIA        SL", (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 1)
+    for i, (name, qty, price) in enumerate(order_lines(rng, n_rows)):
+        y = 40 + 30 * i
+        cv2.line(image, (0, y), (899, y), (0, 0, 0), 1)
+        cv2.putText(image, name, (10, y + 21), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 1)
+        cv2.putText(image, f"{price:,}".replace(",", "."), (500, y + 21), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 1)
+        # Quantities in red, as in the real screenshots
+        cv2.putText(image, str(qty), (760, y + 21), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 220), 2)
+    cv2.imwrite(path, image)
+
+def file_name(retailer, index, day, lotte_ext):
+    return {
+        "cb": f"DU KIEN DH RAU {day:%d.%m.%Y} - {index:03d}-C.BAC-21204.xlsx",
+        "smile_cheers": f"SMILE CHEERS {day:%d.%m} - {index:03d}.xlsx",
+        "satra": f"SATRA {day:%d.%m} - {index:03d}.xlsx",
+        "lotte": f"purchaseOrderList{day:%Y%m%d}{index:06d}{lotte_ext}",
+        "mini": f"21223 - DONG XANH FOOD GIAO {day:%d-%m} - STORE {index:03d}.pdf",
+        "genshai": f"DONG XANH - GIAO HANG NGAY {day.day}.{day.month} - {index:03d}.pdf",
+        "coop": f"CHOT {day:%d.%m} {index:03d}.jpg",
+    }[retailer]
+
+GENERATORS = {
+    "cb": gen_cb, "smile_cheers": gen_smile_cheers, "satra": gen_satra, "lotte": gen_lotte,
+    "mini": gen_mini, "genshai": gen_genshai, "coop": gen_coop,
+}
+
+def generate(work_dir, retailers, n_files, n_rows, seed=0):
+    """Write n_files synthetic inputs per retailer into work_dir/input/<retailer>/."""
+    try:
+        import xlwt  # noqa: F401
+        lotte_ext = ".xls"
+    except ImportError:
+        lotte_ext = ".xlsx"
+
+    rng = random.Random(seed)
+    day = datetime(2025, 7, 10).date()
+    inputs = {}
+    for retailer in retailers:
+        input_dir = os.path.join(work_dir, "input", retailer)
+        os.makedirs(input_dir, exist_ok=True)
+        inputs[retailer] = []
+        for i in range(n_files):
+            path = os.path.join(input_dir, file_name(retailer, i, day + timedelta(days=i % 7), lotte_ext))
+            # Coop screenshots are OCR'd line by line; keep them screenshot-sized
+            rows = min(n_rows, 40) if retailer == "coop" else n_rows
+            GENERATORS[retailer](path, rng, rows, day + timedelta(days=i % 7))
+            inputs[retailer].append(path)
+    return inputs
+
+def bench_path_config(work_dir):
+    paths = {}
+    for retailer in RETAILERS:
+        paths[f"input_{retailer}"] = os.path.join(work_dir, "input", retailer)
+        paths[f"output_{retailer}"] = os.path.join(work_dir, "output", retailer)
+    paths["order_store"] = os.path.join(work_dir, "output", "orders.sqlite")
+    paths["write_json"] = True   # count_rows reads the rows back from the JSON
+    return paths
+
+# ---------------------------------------------------------------- measuring
+
+class StageTimer:
+    """Wraps module functions so each call adds its exclusive wall time to a stage."""
+
+    def __init__(self):
+        self.totals = {}
+        self.stack = []
+
+    def add(self, stage, start):
+        elapsed = time.perf_counter() - start
+        nested = self.stack.pop()
+        self.totals[stage] = self.totals.get(stage, 0.0) + elapsed - nested
+        if self.stack:
+            self.stack[-1] += elapsed
+
+    def timed_iter(self, iterator, stage):
+        """Pass a generator's items through, timing each step it takes to produce one.
+
+        Generators do their work while being consumed, often inside another
+        timed stage; the items are handed on as they come, as in production.
+        """
+        while True:
+            self.stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.add(stage, start)
+            yield item
+
+    def wrap(self, func, stage):
+        timer = self
+
+        def timed(*args, **kwargs):
+            timer.stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                timer.add(stage, start)
+            if hasattr(result, "__next__"):
+                return timer.timed_iter(result, stage)
+            return result
+        return timed
+
+    def install(self, retailer):
+        for module_name, attr, stage in STAGES.get(retailer, []):
+            module = importlib.import_module(module_name)
+            setattr(module, attr, self.wrap(getattr(module, attr), stage))
+
+    def take(self):
+        totals, self.totals = self.totals, {}
+        return totals
+
+def count_rows(outputs):
+    rows = 0
+    for path in outputs:
+        if path.endswith(".json") and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                rows += len(json.load(f).get("rows", []))
+    return rows
+
+def tesseract_available():
+    import pytesseract
+    from ocr_backend import get_backend
+    if get_backend().name == "tesserocr":
+        return True
+    return shutil.which(pytesseract.pytesseract.tesseract_cmd) is not None
+
+def bench_ocr(module, paths, ocr_seconds):
+    """Images/s for the OCR step one image at a time (from the timed run) and as one batch."""
+    from ocr_backend import get_backend
+    settings = module.ocr_settings(module.load_config())
+    # Only images read whole go into a batch; time both in the same mode
+    settings["mode"] = "whole"
+    start = time.perf_counter()
+    module.ocr_images(paths, None, settings)
+    batch_seconds = time.perf_counter() - start
+    return {
+        "backend": get_backend(settings["backend"]).name,
+        "images_per_sec": round(len(paths) / ocr_seconds, 2) if ocr_seconds else None,
+        "batch_images_per_sec": round(len(paths) / batch_seconds, 2) if batch_seconds else None,
+    }
+
+def bench_retailer(retailer, paths, path_config, warmup):
+    """Runs in a fresh process: time every file through the real entry point, return metrics."""
+    spec = run_all.RETAILERS[retailer]
+    module = importlib.import_module(spec["module"])
+    timer = StageTimer()
+    timer.install(retailer)
+    entry = getattr(module, spec["func"])
+    note = None
+    ocr = None
+    has_ocr = retailer == "coop" and tesseract_available()
+
+    if retailer == "coop" and not has_ocr:
+        # No OCR engine here: measure preprocessing only
+        note = "tesseract not installed: preprocessing only"
+
+        def entry(path, _):
+            module.preprocess_image_for_ocr(path)
+            return []
+
+    # The Excel parsers echo their log tail to stdout after every file
+    quiet = open(os.devnull, "w")
+    for path in paths[:warmup]:
+        with contextlib.redirect_stdout(quiet):
+            entry(path, path_config)
+    timer.take()
+
+    files = []
+    for path in paths:
+        start = time.perf_counter()
+        error = None
+        try:
+            with contextlib.redirect_stdout(quiet):
+                outputs = entry(path, path_config) or []
+        except Exception as e:
+            outputs = []
+            error = f"{type(e).__name__}: {e}"
+        seconds = time.perf_counter() - start
+        stages = timer.take()
+        stages["other"] = max(seconds - sum(stages.values()), 0.0)
+        files.append({"file": os.path.basename(path), "seconds": seconds,
+                      "rows": count_rows(outputs), "stages": stages, "error": error})
+
+    quiet.close()
+    if has_ocr:
+        ocr = bench_ocr(module, paths, sum(f["stages"].get("ocr", 0.0) for f in files))
+        note = (f"ocr backend {ocr['backend']}: {ocr['images_per_sec']} images/s one at a time, "
+                f"{ocr['batch_images_per_sec']} images/s batched")
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"files": files, "peak_rss_mb": round(peak_kb / 1024, 1), "note": note, "ocr": ocr}
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+def summarise(retailer, raw):
+    files = raw["files"]
+    seconds = [f["seconds"] for f in files]
+    rows = sum(f["rows"] for f in files)
+    total = sum(seconds)
+    stages = {}
+    for f in files:
+        for stage, value in f["stages"].items():
+            stages[stage] = stages.get(stage, 0.0) + value
+    return {
+        "retailer": retailer,
+        "files": len(files),
+        "errors": sum(1 for f in files if f["error"]),
+        "rows": rows,
+        "seconds": round(total, 4),
+        "rows_per_sec": round(rows / total, 1) if total else None,
+        "p50": round(percentile(seconds, 50), 4) if seconds else None,
+        "p95": round(percentile(seconds, 95), 4) if seconds else None,
+        "stages": {k: round(v / len(files), 5) for k, v in sorted(stages.items())} if files else {},
+        "peak_rss_mb": raw["peak_rss_mb"],
+        "note": raw["note"],
+        "ocr": raw["ocr"],
+    }
+
+def compare(results, baseline, threshold):
+    """Per retailer p50 and rows/sec change vs the baseline; returns the regressed retailers."""
+    base = {r["retailer"]: r for r in baseline.get("results", [])}
+    regressed = []
+    print(f"\n{'retailer':<13} {'p50 base':>9} {'p50 now':>9} {'change':>8} {'rows/s base':>12} {'rows/s now':>11}")
+    for r in results:
+        b = base.get(r["retailer"])
+        if not b or not b.get("p50") or not r.get("p50"):
+            continue
+        change = (r["p50"] - b["p50"]) / b["p50"]
+        flag = "  REGRESSION" if change > threshold else ""
+        if flag:
+            regressed.append(r["retailer"])
+        print(f"{r['retailer']:<13} {b['p50']:>9.4f} {r['p50']:>9.4f} {change:>+7.1%} "
+              f"{b.get('rows_per_sec') or 0:>12} {r.get('rows_per_sec') or 0:>11}{flag}")
+    return regressed
+
+def print_results(results):
+    print(f"{'retailer':<13} {'files':>5} {'rows':>7} {'rows/s':>9} {'p50 s':>8} {'p95 s':>8} {'RSS MB':>7}  stages (mean s/file)")
+    for r in results:
+        stages = " ".join(f"{k}={v:.4f}" for k, v in r["stages"].items())
+        print(f"{r['retailer']:<13} {r['files']:>5} {r['rows']:>7} {r['rows_per_sec'] or 0:>9} "
+              f"{r['p50'] or 0:>8.4f} {r['p95'] or 0:>8.4f} {r['peak_rss_mb']:>7}  {stages}")
+        if r["note"]:
+            print(f"{'':<13} note: {r['note']}")
+        if r["errors"]:
+            print(f"{'':<13} {r['errors']} files failed")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the retailer parsers on synthetic inputs.")
+    parser.add_argument("--retailer", action="append", choices=RETAILERS, help="Only this retailer (repeatable)")
+    parser.add_argument("--files", type=int, default=10, help="Synthetic files per retailer")
+    parser.add_argument("--rows", type=int, default=100, help="Order lines per file")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed runs before measuring")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", help="Keep generated inputs/outputs here (default: a temp dir)")
+    parser.add_argument("--output", default="output/benchmark/results.json", help="Where to write results")
+    parser.add_argument("--baseline", help="Compare with this results file")
+    parser.add_argument("--save-baseline", help="Also write the results here as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="p50 slowdown vs baseline that counts as a regression (default 0.10)")
+    parser.add_argument("--ocr-backend", choices=["auto", "tesserocr", "pytesseract"],
+                        help="OCR engine for coop (default: ocr_backend in column_map_coop.json)")
+    args = parser.parse_args(argv)
+
+    if args.ocr_backend:
+        # Inherited by the spawned benchmark processes
+        os.environ["DXF_OCR_BACKEND"] = args.ocr_backend
+
+    retailers = args.retailer or RETAILERS
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="dxf_bench_")
+    try:
+        inputs = generate(work_dir, retailers, args.files, args.rows, args.seed)
+        path_config = bench_path_config(work_dir)
+
+        results = []
+        ctx = multiprocessing.get_context("spawn")
+        for retailer in retailers:
+            with ctx.Pool(1) as pool:
+                raw = pool.apply(bench_retailer, (retailer, inputs[retailer], path_config, args.warmup))
+            results.append(summarise(retailer, raw))
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_results(results)
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "settings": {"files": args.files, "rows": args.rows, "seed": args.seed,
+                     "ocr_backend": args.ocr_backend},
+        "results": results,
+    }
+    for path in filter(None, [args.output, args.save_baseline]):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressed = compare(results, json.load(f), args.threshold)
+        if regressed:
+            print(f"\nRegressed: {', '.join(regressed)}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+# check_tiled_ocr.py
+#
+# Checks that tiled OCR hands parse_line_text the same lines, in the same
+# order, as reading the whole screenshot at once. The Co.op screenshots are
+# stacked vertically (as in bench_preprocess.py) so they are tall enough to be
+# cut into strips; strip counts that do not divide the stack force cuts inside
+# the tables, not just at the seams between copies.
+#
+# Without tesseract the check uses LineStub, a stand-in engine that reports
+# one text line per band of inked pixel rows, named after the band's pixels.
+# A strip cut through a text line, a line read twice at a seam, or strips
+# stitched out of order all change its output. With an engine installed,
+# --engine also compares the parsed rows from the real OCR.
+#
+#   python check_tiled_ocr.py --stack 1 4 16 --tiles 3 4 5 7
+#   python check_tiled_ocr.py --engine
+
+import sys
+import glob
+import hashlib
+import argparse
+
+import numpy as np
+
+import parse_coop_image as coop
+from ocr_preprocess import Preprocessor, load_image
+
+class LineStub:
+    """Fake OCR engine: one line per run of inked, non-rule pixel rows, with its word box."""
+
+    name = "stub"
+
+    def recognize(self, image):
+        ink = (image == 0).sum(axis=1)
+        text_rows = (ink > 0) & (ink < coop.RULE_FRACTION * image.shape[1])
+        edges = np.flatnonzero(np.diff(np.concatenate(([False], text_rows, [False])).astype(np.int8)))
+        lines, tops = [], []
+        for top, bottom in zip(edges[::2], edges[1::2]):
+            lines.append(hashlib.sha1(image[top:bottom].tobytes()).hexdigest()[:12])
+            tops.append(int(top))
+        words = {"block_num": [1] * len(lines), "top": tops, "text": lines}
+        return {"text": "\n".join(lines) + "\n\f", "words": words}
+
+    def recognize_many(self, images, workers):
+        return [self.recognize(image) for image in images]
+
+def text_lines(result):
+    return [line.strip() for line in result["text"].split("\n") if line.strip()]
+
+def compare(whole, tiled):
+    """None when both results give the same lines and word positions, else what differs."""
+    if text_lines(whole) != text_lines(tiled):
+        return f"lines differ: {len(text_lines(whole))} whole vs {len(text_lines(tiled))} tiled"
+    if "top" in whole["words"] and whole["words"]["top"] != tiled["words"].get("top"):
+        return "word positions differ"
+    return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check tiled OCR against whole-image OCR.")
+    parser.add_argument("--images", default="input/coop/*.jpg")
+    parser.add_argument("--stack", type=int, nargs="+", default=[1, 4, 16],
+                        help="Stack each screenshot this many times vertically")
+    parser.add_argument("--tiles", type=int, nargs="+",
+                        help="Strip counts to try (default: ocr_tiles from the config, 3, 5 and 7)")
+    parser.add_argument("--engine", action="store_true",
+                        help="Also compare parsed rows using the configured OCR engine")
+    args = parser.parse_args(argv)
+
+    settings = coop.ocr_settings(coop.load_config())
+    paths = sorted(glob.glob(args.images))
+    if not paths:
+        print(f"No images match {args.images}")
+        return 1
+    backends = [LineStub()] + ([coop.get_backend(settings["backend"])] if args.engine else [])
+    preprocessor = Preprocessor(trim_margin=settings["trim_margin"])
+    tile_counts = args.tiles or sorted({settings["tiles"], 3, 5, 7})
+    tax = coop.load_config().get("tax", 0)
+
+    failures = 0
+    checks = 0
+    for stack in args.stack:
+        for path in paths:
+            image = preprocessor.run(np.vstack([load_image(path)] * stack)).copy()
+            for backend in backends:
+                whole = coop.run_ocr(image, backend)
+                for tiles in tile_counts:
+                    bounds = coop.strip_bounds(image, tiles, settings["min_tile_height"])
+                    if len(bounds) == 1:
+                        continue
+                    tiled = coop.run_ocr_tiled(image, tiles, settings["workers"], settings["min_tile_height"], backend)
+                    problem = compare(whole, tiled)
+                    if problem is None and backend.name != "stub":
+                        if coop.parse_line_text(whole["text"], tax) != coop.parse_line_text(tiled["text"], tax):
+                            problem = "parsed rows differ"
+                    checks += 1
+                    if problem is not None:
+                        failures += 1
+                        print(f"[FAIL] {backend.name} stack={stack} strips={len(bounds)} {path}: {problem}")
+    print(f"{checks - failures}/{checks} tiled reads identical to whole-image reads")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+# classify.py
+#
+# Works out which retailer (and forecast vs confirmed) a dropped file belongs
+# to from its content, so email attachments can be saved into one inbox folder
+# instead of being sorted into input/<retailer>/ by hand. Only the start of
+# each file is read: magic bytes, workbook sheet names and the first strings,
+# the first PDF page's text or the image header.
+#
+#   python classify.py input/inbox/*
+
+import os
+import re
+import sys
+import html
+import struct
+import zipfile
+from collections import namedtuple
+
+from order_store import order_type_of
+
+HEAD_BYTES = 64 * 1024
+XLS_HEAD_ROWS = 12
+
+# Content markers; every marker of an entry must appear (a tuple: any one of them).
+# Checked in order, first match wins
+WORKBOOK_SIGNATURES = [
+    ("cb", "C.BAC-21204", ["TEN HANG", ("LƯỢNG NCC", "TONG LUONG")]),
+    ("smile_cheers", "C.BAC-21204", ["TÊN HÀNG", "ĐG"]),
+    ("satra", None, ["NGÀY GIAO HÀNG:", "TÊN HÀNG HÓA"]),
+    ("lotte", None, ["Mã đơn đặt hàng", "Tên sản phẩm"]),
+]
+PDF_SIGNATURES = [
+    ("mini", ["TEN HANG", "LUONG DAT"]),
+    ("genshai", ["Số đơn hàng:", "Ngày giao hàng:"]),
+]
+
+# Co.op order screenshots are wide table captures; anything smaller is a logo or signature image
+MIN_IMAGE_WIDTH = 600
+MIN_IMAGE_HEIGHT = 150
+
+Classification = namedtuple("Classification", ["path", "retailer", "order_type", "kind", "reason"])
+
+_seen = {}   # path -> (mtime_ns, size, Classification), so repeated scans only read new or changed files
+
+def sniff(head):
+    if head.startswith(b"%PDF"):
+        return "pdf"
+    if head.startswith(b"PK\x03\x04"):
+        return "zip"
+    if head.startswith(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"):
+        return "ole"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    return None
+
+def xml_strings(data):
+    return [html.unescape(t) for t in re.findall(r"<t[^>]*>([^<]*)</t>", data.decode("utf-8", errors="ignore"))]
+
+def xlsx_head(path):
+    """(sheet names, text of the first strings) from an .xlsx without loading the workbook."""
+    with zipfile.ZipFile(path) as z:
+        names = set(z.namelist())
+        if "xl/workbook.xml" not in names:
+            return None
+        workbook = z.read("xl/workbook.xml").decode("utf-8", errors="ignore")
+        sheets = [html.unescape(s) for s in re.findall(r'<sheet\b[^>]*\bname="([^"]*)"', workbook)]
+        strings = []
+        # Shared strings hold the header labels; inline strings (some generated files) sit in the sheet
+        for part in ("xl/sharedStrings.xml", "xl/worksheets/sheet1.xml"):
+            if part in names:
+                with z.open(part) as f:
+                    strings += xml_strings(f.read(HEAD_BYTES))
+    return sheets, "\n".join(strings)
+
+def xls_head(path):
+    import xlrd
+    book = xlrd.open_workbook(path, on_demand=True)
+    try:
+        sheet = book.sheet_by_index(0)
+        cells = []
+        for row_idx in range(min(XLS_HEAD_ROWS, sheet.nrows)):
+            cells += [str(v) for v in sheet.row_values(row_idx) if v not in ("", None)]
+        return book.sheet_names(), "\n".join(cells)
+    finally:
+        book.release_resources()
+
+def has_markers(text, markers):
+    return all(
+        any(m in text for m in marker) if isinstance(marker, tuple) else marker in text
+        for marker in markers
+    )
+
+def match_workbook(sheets, text):
+    for retailer, sheet_name, markers in WORKBOOK_SIGNATURES:
+        if sheet_name and sheet_name not in sheets:
+            continue
+        if has_markers(text, markers):
+            return retailer
+    return None
+
+def pdf_first_page_text(path):
+    import pypdfium2 as pdfium
+    pdf = pdfium.PdfDocument(path)
+    try:
+        page = pdf[0]
+        textpage = page.get_textpage()
+        text = textpage.get_text_bounded()
+        textpage.close()
+        page.close()
+        return text
+    finally:
+        pdf.close()
+
+def match_pdf(text):
+    for retailer, markers in PDF_SIGNATURES:
+        if has_markers(text, markers):
+            return retailer
+    return None
+
+def image_size(head, kind):
+    """(width, height) from a PNG IHDR or the first JPEG SOF marker, or None."""
+    if kind == "png":
+        if len(head) >= 24:
+            return struct.unpack(">II", head[16:24])
+        return None
+    pos = 2
+    while pos + 9 < len(head):
+        if head[pos] != 0xFF:
+            pos += 1
+            continue
+        marker = head[pos + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        length = struct.unpack(">H", head[pos + 2:pos + 4])[0]
+        # SOF0-SOF15 except DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", head[pos + 5:pos + 9])
+            return width, height
+        pos += 2 + length
+    return None
+
+def classify(path):
+    """Classification of one file; retailer is None (with the reason) when it is not recognised."""
+    name = os.path.basename(path)
+    order_type = order_type_of({"source_file": name})
+    with open(path, "rb") as f:
+        head = f.read(HEAD_BYTES)
+    kind = sniff(head)
+
+    def result(retailer, reason=None):
+        return Classification(path, retailer, order_type, kind, reason)
+
+    try:
+        if kind == "zip":
+            found = xlsx_head(path)
+            if found is None:
+                return result(None, "zip archive without a workbook")
+            retailer = match_workbook(*found)
+            return result(retailer, None if retailer else f"unknown workbook (sheets {found[0]})")
+        if kind == "ole":
+            retailer = match_workbook(*xls_head(path))
+            return result(retailer, None if retailer else "unknown .xls workbook")
+        if kind == "pdf":
+            retailer = match_pdf(pdf_first_page_text(path))
+            return result(retailer, None if retailer else "unknown PDF layout")
+        if kind in ("png", "jpeg"):
+            size = image_size(head, kind)
+            if size is None:
+                return result(None, "unreadable image header")
+            if size[0] < MIN_IMAGE_WIDTH or size[1] < MIN_IMAGE_HEIGHT:
+                return result(None, f"image too small for an order screenshot ({size[0]}x{size[1]})")
+            return result("coop")
+    except Exception as e:
+        return result(None, f"{type(e).__name__}: {e}")
+    return result(None, "unrecognised file type")
+
+def classify_dir(input_dir):
+    """Classification of every file directly inside input_dir, sorted by name.
+
+    Results are remembered per path until the file's mtime or size changes,
+    so a watcher polling the inbox does not re-read files it has seen.
+    """
+    results = []
+    for name in sorted(os.listdir(input_dir)):
+        path = os.path.join(input_dir, name)
+        # Dotfiles and Office lock files ("~$book.xlsx") are never orders
+        if name.startswith((".", "~$")) or not os.path.isfile(path):
+            continue
+        st = os.stat(path)
+        cached = _seen.get(path)
+        if cached is None or cached[:2] != (st.st_mtime_ns, st.st_size):
+            cached = _seen[path] = (st.st_mtime_ns, st.st_size, classify(path))
+        results.append(cached[2])
+    return results
+
+def main(argv=None):
+    paths = argv if argv is not None else sys.argv[1:]
+    if not paths:
+        print("usage: python classify.py FILE_OR_DIR ...")
+        return 2
+    unknown = 0
+    for path in paths:
+        for c in classify_dir(path) if os.path.isdir(path) else [classify(path)]:
+            if c.retailer:
+                print(f"{c.retailer:<13} {c.order_type:<10} {os.path.basename(c.path)}")
+            else:
+                unknown += 1
+                print(f"{'?':<13} {'':<10} {os.path.basename(c.path)}: {c.reason}")
+    return 1 if unknown else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+# config_registry.py
+#
+# Column maps loaded once per process instead of once per input file. Each
+# config/column_map_<retailer>.json is read, checked and frozen on first use;
+# later calls only stat the file and get the same object back until the file
+# changes on disk.
+#
+#   from config_registry import load_config, load_rules
+#   config = load_config("cb")       # read-only mapping, as in the JSON file
+#   rules = load_rules("satra")      # column letters/cells resolved to indexes
+
+import os
+import sys
+import json
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+from openpyxl.utils.cell import coordinate_from_string
+
+from excel_reader import column_index
+
+# retailer -> (config file, top-level key holding the map or None for the whole file)
+CONFIG_FILES = {
+    "cb": ("config/column_map_cb.json", None),
+    "satra": ("config/column_map_satra.json", None),
+    "smile_cheers": ("config/column_map_smile_cheers.json", None),
+    "lotte": ("config/column_map_lotte.json", "lotte_excel"),
+    "mini": ("config/column_map_mini.json", "mini_order"),
+    "genshai": ("config/column_map_genshai.json", "genshai"),
+    "coop": ("config/column_map_coop.json", None),
+}
+
+# Keys each map must have, as dotted paths
+REQUIRED = {
+    "cb": ["sheet_name", "header_row", "columns.product_name", "columns.quantity_candidates", "defaults.tax"],
+    "satra": ["delivery_date_cell", "product_name_column", "product_name_header_row", "warehouse_columns", "tax"],
+    "smile_cheers": ["sheet_name", "header_row", "columns.product_name", "columns.qty", "columns.unit_price",
+                     "delivery_date_cell", "tax"],
+    "lotte": ["date_format"],
+    "mini": ["tax"],
+    "genshai": ["product_name", "qty", "unit_price", "tax"],
+    "coop": [],
+}
+
+SatraRules = namedtuple("SatraRules", ["date_cell", "product_idx", "start_row", "first_row", "warehouses", "tax"])
+Warehouse = namedtuple("Warehouse", ["name", "qty_idx", "start_row"])
+
+class ConfigError(ValueError):
+    pass
+
+def freeze(value):
+    """Read-only copy of decoded JSON: dicts become mapping proxies, lists tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+def lookup(config, dotted):
+    value = config
+    for part in dotted.split("."):
+        if not hasattr(value, "get") or part not in value:
+            raise KeyError(dotted)
+        value = value[part]
+    return value
+
+def check_cell(ref):
+    coordinate_from_string(ref)
+    return ref
+
+def check_column(letter):
+    return column_index(letter)
+
+def validate(retailer, config, path):
+    missing = []
+    for key in REQUIRED[retailer]:
+        try:
+            lookup(config, key)
+        except KeyError:
+            missing.append(key)
+    if missing:
+        raise ConfigError(f"{path}: missing {', '.join(missing)}")
+
+    try:
+        if retailer == "satra":
+            check_cell(config["delivery_date_cell"])
+            check_column(config["product_name_column"])
+            for warehouse, meta in config["warehouse_columns"].items():
+                check_column(meta["qty_col"])
+                int(meta["header_row"])
+        elif retailer == "smile_cheers":
+            check_cell(config["delivery_date_cell"])
+        elif retailer == "genshai":
+            for key in REQUIRED["genshai"]:
+                if not isinstance(config[key], int):
+                    raise ValueError(f"column {key} must be an index, got {config[key]!r}")
+    except (KeyError, ValueError, TypeError) as e:
+        raise ConfigError(f"{path}: {e}") from e
+
+def compile_satra(config):
+    start_row = config["product_name_header_row"] + 1
+    warehouses = tuple(
+        Warehouse(name, column_index(meta["qty_col"]), meta["header_row"] + 1)
+        for name, meta in config["warehouse_columns"].items()
+    )
+    return SatraRules(
+        date_cell=config["delivery_date_cell"],
+        product_idx=column_index(config["product_name_column"]),
+        start_row=start_row,
+        first_row=min([start_row] + [w.start_row for w in warehouses]),
+        warehouses=warehouses,
+        tax=config["tax"],
+    )
+
+COMPILERS = {
+    "satra": compile_satra,
+}
+
+class ConfigRegistry:
+    """Validated, frozen column maps (and their compiled rules), reloaded when the file changes."""
+
+    def __init__(self, files=None):
+        self.files = dict(files or CONFIG_FILES)
+        self.entries = {}   # retailer -> (stamp, config, rules)
+        self.lock = threading.Lock()
+
+    def stamp(self, path):
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+
+    def entry(self, retailer):
+        path, root = self.files[retailer]
+        stamp = self.stamp(path)
+        cached = self.entries.get(retailer)
+        if cached is not None and cached[0] == stamp:
+            return cached
+        with self.lock:
+            cached = self.entries.get(retailer)
+            if cached is not None and cached[0] == stamp:
+                return cached
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if root is not None:
+                if root not in data:
+                    raise ConfigError(f"{path}: missing {root}")
+                data = data[root]
+            validate(retailer, data, path)
+            config = freeze(data)
+            compiler = COMPILERS.get(retailer)
+            cached = (stamp, config, compiler(config) if compiler else None)
+            self.entries[retailer] = cached
+            return cached
+
+    def config(self, retailer):
+        return self.entry(retailer)[1]
+
+    def rules(self, retailer):
+        return self.entry(retailer)[2]
+
+    def clear(self):
+        self.entries.clear()
+
+registry = ConfigRegistry()
+
+def load_config(retailer):
+    return registry.config(retailer)
+
+def load_rules(retailer):
+    return registry.rules(retailer)
+
+def main(argv=None):
+    """Validate every column map: python config_registry.py"""
+    failed = 0
+    for retailer in CONFIG_FILES:
+        try:
+            registry.config(retailer)
+            print(f"[OK] {retailer}: {CONFIG_FILES[retailer][0]}")
+        except (OSError, ValueError) as e:
+            failed += 1
+            print(f"[ERROR] {retailer}: {e}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,155 @@
+# consolidate.py
+
+import os
+import sys
+import json
+import glob
+import argparse
+import pandas as pd
+
+import order_store
+from order_store import RETAILERS, order_type_of
+from product_index import load_index, resolve_names
+
+COLUMNS = order_store.LINE_COLUMNS
+
+def load_path_config(path="config/paths.json"):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["paths"]
+
+def iter_records(path_config, retailers=None):
+    for retailer in retailers or RETAILERS:
+        output_dir = path_config.get(f"output_{retailer}")
+        if not output_dir:
+            continue
+        for json_path in sorted(glob.glob(os.path.join(output_dir, "*.json"))):
+            try:
+                with open(json_path, encoding="utf-8") as f:
+                    record = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[WARN] Skipping unreadable output {json_path}: {e}")
+                continue
+            yield retailer, record
+
+def build_order_table(records):
+    """Flatten normalised parser records into one columnar DataFrame, one row per order line."""
+    columns = {name: [] for name in COLUMNS}
+    for retailer, record in records:
+        rows = record.get("rows") or []
+        n = len(rows)
+        if not n:
+            continue
+        # Header fields are repeated per line; extend is much cheaper than per-row dicts
+        columns["delivery_date"].extend([record.get("delivery_date")] * n)
+        columns["retailer"].extend([retailer] * n)
+        columns["store"].extend([record.get("store")] * n)
+        columns["order_slip"].extend([record.get("order_slip")] * n)
+        columns["order_type"].extend([order_type_of(record)] * n)
+        columns["source_file"].extend([record.get("source_file")] * n)
+        for row in rows:
+            columns["product_name"].append(row.get("product_name"))
+            columns["qty"].append(row.get("qty"))
+            columns["unit_price"].append(row.get("unit_price"))
+            columns["tax"].append(row.get("tax"))
+
+    return with_amount(pd.DataFrame(columns, columns=COLUMNS))
+
+def with_amount(df):
+    for col in ("qty", "unit_price", "tax"):
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    df["amount"] = df["qty"] * df["unit_price"]
+    return df
+
+def load_order_table(path_config, dates=None, from_json=False, retailers=None):
+    """Order lines from the order store in one query, or rebuilt from the per-file JSON outputs.
+
+    dates and retailers narrow the query. Falls back to the JSON outputs when
+    no store has been written yet.
+    """
+    path = order_store.store_path(path_config)
+    if from_json or not os.path.exists(path):
+        df = build_order_table(iter_records(path_config, retailers))
+        return df[df["delivery_date"].isin(dates)] if dates else df
+    return with_amount(order_store.read_lines(path, dates, retailers))
+
+def daily_totals(df, by, include_forecast=False):
+    if not include_forecast:
+        df = df[df["order_type"] != "forecast"]
+    keys = ["delivery_date"] + by
+    totals = (
+        df.groupby(keys, dropna=False, sort=True)
+          .agg(qty=("qty", "sum"),
+               amount=("amount", "sum"),
+               lines=("qty", "size"))
+          .reset_index()
+    )
+    return totals
+
+def write_table(df, output_dir, name, fmt):
+    os.makedirs(output_dir, exist_ok=True)
+    if fmt == "parquet":
+        path = os.path.join(output_dir, f"{name}.parquet")
+        df.to_parquet(path, index=False)
+    else:
+        path = os.path.join(output_dir, f"{name}.csv")
+        df.to_csv(path, index=False, encoding="utf-8-sig")
+    return path
+
+def add_canonical_products(df, index):
+    """sku and canonical_name columns, resolving each distinct raw product name once."""
+    matches = resolve_names(df["product_name"], index)
+    df["sku"] = df["product_name"].map(lambda name: getattr(matches.get(name), "sku", None))
+    df["canonical_name"] = df["product_name"].map(lambda name: getattr(matches.get(name), "name", None))
+    return df
+
+def write_totals(df, output_dir, fmt, include_forecast):
+    tables = {
+        "order_lines": df,
+        "daily_product_totals": daily_totals(df, ["product_name"], include_forecast),
+        "daily_retailer_totals": daily_totals(df, ["retailer"], include_forecast),
+        "daily_retailer_product_totals": daily_totals(df, ["retailer", "product_name"], include_forecast),
+    }
+    if "sku" in df.columns:
+        tables["daily_sku_totals"] = daily_totals(df, ["sku", "canonical_name"], include_forecast)
+    return [write_table(table, output_dir, name, fmt) for name, table in tables.items()]
+
+def consolidate(path_config, output_dir=None, fmt="csv", dates=None, include_forecast=False, from_json=False):
+    """Write season-wide totals, or, when dates are given, one folder of totals per delivery date."""
+    output_dir = output_dir or path_config.get("output_consolidated", "output/consolidated/")
+    df = load_order_table(path_config, dates, from_json)
+    index = load_index()
+    if index is not None:
+        df = add_canonical_products(df, index)
+
+    if not dates:
+        written = write_totals(df, output_dir, fmt, include_forecast)
+        print(f"Consolidated {len(df)} order lines across "
+              f"{df['delivery_date'].nunique()} delivery dates → {output_dir}")
+        return written
+
+    written = []
+    for date in dates:
+        day = df[df["delivery_date"] == date]
+        written.extend(write_totals(day, os.path.join(output_dir, str(date)), fmt, include_forecast))
+        print(f"Consolidated {len(day)} order lines for {date} → {os.path.join(output_dir, str(date))}")
+    return written
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aggregate parsed orders into per-day totals.")
+    parser.add_argument("--paths", default="config/paths.json", help="Path config file")
+    parser.add_argument("--output-dir", help="Where to write the consolidated tables")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--date", action="append",
+                        help="Only consolidate this delivery date (YYYY-MM-DD), into its own sub-folder")
+    parser.add_argument("--include-forecast", action="store_true",
+                        help="Count DU KIEN forecast orders in the daily totals")
+    parser.add_argument("--from-json", action="store_true",
+                        help="Read output/<retailer>/*.json instead of the order store")
+    args = parser.parse_args(argv)
+
+    consolidate(load_path_config(args.paths), args.output_dir, args.format,
+                args.date, args.include_forecast, args.from_json)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+# excel_reader.py
+
+import io
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils.cell import coordinate_from_string, column_index_from_string
+
+from order_rows import OrderRow
+
+SheetData = namedtuple("SheetData", ["cells", "rows"])
+
+# Strings pandas.read_excel turns into NaN by default; kept so frames built
+# from raw rows behave exactly like the read_excel frames they replace
+NA_VALUES = {
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a",
+    "nan", "null",
+}
+
+def column_index(letter):
+    """Zero-based tuple index of an Excel column letter ("A" -> 0)."""
+    return column_index_from_string(letter) - 1
+
+def cell(row, idx):
+    return row[idx] if idx < len(row) else None
+
+def open_workbook(source):
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    return load_workbook(source, read_only=True, data_only=True)
+
+def iter_rows(source, sheet_name=None, min_row=1):
+    """Yield one sheet's rows as plain value tuples, streaming from a read-only workbook."""
+    wb = open_workbook(source)
+    try:
+        ws = wb[sheet_name] if sheet_name else wb.active
+        # Many supplier exports carry a stale <dimension>; without this the
+        # read-only reader can stop early or pad every row to a bogus width
+        ws.reset_dimensions()
+        yield from ws.iter_rows(min_row=min_row, values_only=True)
+    finally:
+        wb.close()
+
+def read_sheet(source, sheet_name=None, cells=(), min_row=1):
+    """Stream one sheet once, returning the requested header cells and the rows from min_row on.
+
+    source may be a path, a file object or raw bytes. Rows are plain tuples of
+    cell values with trailing empty rows dropped; they are not padded, so use
+    cell() for lookups past the end of a short row.
+    """
+    wanted = {}
+    for ref in cells:
+        col, row = coordinate_from_string(ref)
+        wanted.setdefault(row, []).append((ref, column_index(col)))
+
+    values = {ref: None for ref in cells}
+    rows = []
+    for row_idx, row in enumerate(iter_rows(source, sheet_name), start=1):
+        for ref, col_idx in wanted.get(row_idx, ()):
+            values[ref] = cell(row, col_idx)
+        if row_idx >= min_row:
+            rows.append(row)
+
+    while rows and all(v is None for v in rows[-1]):
+        rows.pop()
+    return SheetData(values, rows)
+
+def header_names(header, width):
+    names = []
+    counts = {}
+    for idx in range(width):
+        name = cell(header, idx)
+        if name is None or (isinstance(name, str) and name == ""):
+            name = f"Unnamed: {idx}"
+        # Same de-duplication as read_excel: "X", "X.1", "X.2", ...
+        if name in counts:
+            counts[name] += 1
+            name = f"{name}.{counts[name]}"
+        else:
+            counts[name] = 0
+        names.append(name)
+    return names
+
+def rows_to_frame(rows, header_index):
+    """Build the DataFrame pd.read_excel(header=header_index) would return from raw row tuples."""
+    if header_index >= len(rows):
+        return pd.DataFrame()
+    width = max(len(r) for r in rows[header_index:])
+    columns = header_names(rows[header_index], width)
+    data = [
+        tuple(row) + (None,) * (width - len(row))
+        for row in rows[header_index + 1:]
+        if any(v is not None for v in row)
+    ]
+
+    df = pd.DataFrame(data, columns=columns, dtype=object)
+    df = df.mask(df.isna() | df.isin(NA_VALUES), np.nan)
+    return df.infer_objects()
+
+def coerce_float(series):
+    """Vectorised float(): the converted values plus a mask of the cells float() would accept.
+
+    NaN is accepted (float(nan) does not raise). The few non-numeric leftovers
+    in object columns, such as padded numeric strings, go through float()
+    itself so the result matches a per-cell loop exactly.
+    """
+    raw = series.to_numpy(dtype=object)
+    values = np.array(pd.to_numeric(series, errors="coerce"), dtype=float)
+    ok = pd.isna(raw) | ~np.isnan(values)
+    if series.dtype == object:
+        for idx in np.flatnonzero(~ok):
+            try:
+                values[idx] = float(raw[idx])
+                ok[idx] = True
+            except (ValueError, TypeError):
+                pass
+    return values, ok
+
+def normalise_rows(df, product_col, qty_col, unit_price_col, tax):
+    """Turn a sheet frame into the parsers' OrderRows using column operations only.
+
+    Keeps exactly the rows the old iterrows loops kept: product name present
+    and not "nan"/"tổng cộng", quantity accepted by float(); a unit price that
+    float() rejects (or a missing price column) becomes None.
+    """
+    n = len(df)
+    if product_col in df.columns:
+        # Through numpy so missing cells become "nan" exactly like str(nan) did
+        names = pd.Series(df[product_col].to_numpy(dtype=object).astype(str), index=df.index, dtype=object).str.strip()
+    else:
+        names = pd.Series(["None"] * n, index=df.index, dtype=object)
+    keep = np.array(((names != "") & ~names.str.lower().isin(["nan", "tổng cộng"])), dtype=bool)
+
+    if qty_col in df.columns:
+        qty, qty_ok = coerce_float(df[qty_col])
+        keep &= qty_ok
+    else:
+        qty = np.full(n, np.nan)
+        keep[:] = False
+
+    if unit_price_col and unit_price_col in df.columns:
+        price, price_ok = coerce_float(df[unit_price_col])
+        unit_price = price.astype(object)
+        unit_price[~price_ok] = None
+    else:
+        unit_price = np.full(n, None, dtype=object)
+
+    # Zipping the filtered columns as native lists beats DataFrame.to_dict("records"),
+    # which boxes every cell through pandas' scalar machinery
+    return [
+        OrderRow(name, q, price, tax)
+        for name, q, price in zip(names.to_numpy()[keep].tolist(), qty[keep].tolist(), unit_price[keep].tolist())
+    ]
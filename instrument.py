@@ -0,0 +1,257 @@
+# instrument.py
+#
+# Per-stage timing and memory spans for the parsers. Off unless DXF_METRICS
+# names a metrics file; then every span appends one JSON line to it:
+#
+#   {"ts": "...", "pid": 4121, "span": "open", "path": "file/open", "retailer": "cb",
+#    "file": "DXF 10.7.xlsx", "seconds": 0.0213, "rows": null, "mem_kb": 812}
+#
+# DXF_PROFILE=tracemalloc adds each span's peak traced allocation (peak_kb);
+# DXF_PROFILE=cprofile profiles every file and writes the stats next to the
+# metrics file under profiles/. Summarise a metrics file with
+#
+#   python instrument.py summary output/metrics.jsonl
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from datetime import datetime
+from functools import wraps
+
+PROFILE_MODES = ("cprofile", "tracemalloc")
+
+_settings = None
+_local = threading.local()
+
+def settings():
+    """(metrics path or None, profile mode or None), read from the environment once per process."""
+    global _settings
+    if _settings is None:
+        path = os.environ.get("DXF_METRICS") or None
+        profile = os.environ.get("DXF_PROFILE", "").lower() or None
+        if profile not in PROFILE_MODES:
+            profile = None
+        if path and profile == "tracemalloc":
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+        _settings = (path, profile)
+    return _settings
+
+def configure(path=None, profile=None):
+    """Switch metrics on (or off with path=None) for this process and any worker it starts."""
+    global _settings
+    for name, value in (("DXF_METRICS", path), ("DXF_PROFILE", profile)):
+        if value:
+            os.environ[name] = value
+        else:
+            os.environ.pop(name, None)
+    _settings = None
+    return settings()
+
+def enabled():
+    return (_settings or settings())[0] is not None
+
+def memory_kb():
+    """Traced Python allocations under tracemalloc, otherwise the process's resident set size."""
+    if (_settings or settings())[1] == "tracemalloc":
+        import tracemalloc
+        return tracemalloc.get_traced_memory()[0] // 1024
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+class NullSpan:
+    """What span() returns while metrics are off: a reusable no-op."""
+
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+NULL_SPAN = NullSpan()
+
+class Span:
+    """One timed stage. Set .rows inside the block to record how many rows it produced.
+
+    Spans nest per thread; a child inherits its parent's retailer and file.
+    A span whose rows were never set reports the rows of the last child that
+    set them, so a file span carries the rows its final stage wrote. Records are
+    buffered until the outermost span ends and then appended in one write.
+    """
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+        self.rows = fields.pop("rows", None)
+        self.child_rows = None
+        self.peak = 0
+        self.profiler = None
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self.parent = stack[-1] if stack else None
+        if self.parent is not None:
+            for key in ("retailer", "file"):
+                if key in self.parent.fields:
+                    self.fields.setdefault(key, self.parent.fields[key])
+            self.path = f"{self.parent.path}/{self.name}"
+            self.records = self.parent.records
+        else:
+            self.path = self.name
+            self.records = []
+
+        profile = settings()[1]
+        if profile == "tracemalloc":
+            import tracemalloc
+            if self.parent is not None:
+                self.parent.peak = max(self.parent.peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        elif profile == "cprofile" and self.parent is None:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+        stack.append(self)
+        self.mem_start = memory_kb()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        mem_kb = memory_kb() - self.mem_start
+        _local.stack.pop()
+
+        rows = self.rows if self.rows is not None else self.child_rows
+        record = {
+            "ts": datetime.now().isoformat(timespec="milliseconds"),
+            "pid": os.getpid(),
+            "span": self.name,
+            "path": self.path,
+            **self.fields,
+            "seconds": round(seconds, 6),
+            "rows": rows,
+            "mem_kb": mem_kb,
+        }
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+
+        if settings()[1] == "tracemalloc":
+            import tracemalloc
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            record["peak_kb"] = self.peak // 1024
+            if self.parent is not None:
+                self.parent.peak = max(self.parent.peak, self.peak)
+                tracemalloc.reset_peak()
+        if self.profiler is not None:
+            self.profiler.disable()
+            record["profile"] = self.dump_profile()
+
+        if self.parent is not None and rows is not None:
+            self.parent.child_rows = rows
+        self.records.append(record)
+        if self.parent is None:
+            write_records(self.records)
+        return False
+
+    def dump_profile(self):
+        stem = os.path.splitext(str(self.fields.get("file", self.name)))[0]
+        profile_dir = os.path.join(os.path.dirname(settings()[0]) or ".", "profiles")
+        os.makedirs(profile_dir, exist_ok=True)
+        prefix = f"{self.fields['retailer']}-" if "retailer" in self.fields else ""
+        path = os.path.join(profile_dir, f"{prefix}{stem}-{os.getpid()}.prof")
+        self.profiler.dump_stats(path)
+        return path
+
+def write_records(records):
+    path = settings()[0]
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Workers append concurrently; one write per file keeps each file's lines together
+    data = "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in records)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(data)
+
+def span(name, **fields):
+    """Context manager timing one stage; a shared no-op when metrics are off."""
+    if (_settings or settings())[0] is None:
+        return NULL_SPAN
+    return Span(name, fields)
+
+def file_span(retailer):
+    """Decorator for a parser's per-file entry point: wraps each call in a "file" span.
+
+    The input is the call's first argument (a path).
+    """
+    def decorate(func):
+        @wraps(func)
+        def wrapper(path, /, *args, **kwargs):
+            # Positional-only, so parsers can still take a source= keyword
+            if (_settings or settings())[0] is None:
+                return func(path, *args, **kwargs)
+            with Span("file", {"retailer": retailer, "file": os.path.basename(str(path))}):
+                return func(path, *args, **kwargs)
+        return wrapper
+    return decorate
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+def summarise(path):
+    """{(retailer, span path): stats} over every record in a metrics file."""
+    groups = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            groups.setdefault((record.get("retailer") or "-", record["path"]), []).append(record)
+
+    summary = {}
+    for key, records in sorted(groups.items()):
+        seconds = [r["seconds"] for r in records]
+        rows = [r["rows"] for r in records if r.get("rows") is not None]
+        summary[key] = {
+            "count": len(records),
+            "total_s": round(sum(seconds), 4),
+            "mean_s": round(sum(seconds) / len(seconds), 4),
+            "p95_s": round(percentile(seconds, 0.95), 4),
+            "rows": sum(rows) if rows else None,
+            "max_mem_kb": max(r["mem_kb"] for r in records),
+        }
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarise a parser metrics file.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    summ = sub.add_parser("summary", help="Time, rows and memory per retailer and stage")
+    summ.add_argument("metrics", nargs="?", default="output/metrics.jsonl")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.metrics):
+        print(f"No metrics file at {args.metrics}")
+        return 1
+    print(f"{'retailer':<13} {'stage':<22} {'count':>6} {'total s':>9} {'mean s':>8} {'p95 s':>8} "
+          f"{'rows':>8} {'mem KB':>8}")
+    for (retailer, path), stats in summarise(args.metrics).items():
+        rows = "" if stats["rows"] is None else stats["rows"]
+        print(f"{retailer:<13} {path:<22} {stats['count']:>6} {stats['total_s']:>9} {stats['mean_s']:>8} "
+              f"{stats['p95_s']:>8} {rows:>8} {stats['max_mem_kb']:>8}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
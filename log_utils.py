@@ -0,0 +1,105 @@
+# log_utils.py
+
+import os
+import sys
+import json
+import logging
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+def default_level():
+    """Level from DXF_LOG_LEVEL (DEBUG, INFO, ...); INFO when unset, so debug output is off."""
+    return getattr(logging, os.environ.get("DXF_LOG_LEVEL", "INFO").upper(), logging.INFO)
+
+def json_enabled():
+    return os.environ.get("DXF_LOG_FORMAT", "text").lower() == "json"
+
+class TextFormatter(logging.Formatter):
+    """The parsers' usual line format, with any structured fields appended as key=value."""
+
+    def __init__(self):
+        super().__init__(LOG_FORMAT)
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message and structured fields."""
+
+    def format(self, record):
+        event = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        event.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            event["exc"] = self.formatException(record.exc_info)
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+def make_formatter(as_json=None):
+    return JsonFormatter() if (json_enabled() if as_json is None else as_json) else TextFormatter()
+
+def setup_logger(name, log_path=None, level=None, console=False, as_json=None):
+    logger = logging.getLogger(name)
+    logger.setLevel(level or default_level())
+    logger.propagate = False
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+
+    formatter = make_formatter(as_json)
+    if log_path:
+        os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+        fh = logging.FileHandler(log_path, encoding='utf-8')
+        fh.setFormatter(formatter)
+        logger.addHandler(fh)
+    if console:
+        sh = logging.StreamHandler(sys.stdout)
+        sh.setFormatter(formatter)
+        logger.addHandler(sh)
+    return logger
+
+_loggers = {}   # name -> (arguments, handlers) of the last get_logger setup
+
+def get_logger(name, log_path=None, level=None, console=False, as_json=None):
+    """setup_logger for per-file callers: the handlers are built on the first call and reused
+    while the arguments (and the logger's handlers) stay the same."""
+    args = (log_path, level or default_level(), console, json_enabled() if as_json is None else as_json)
+    logger = logging.getLogger(name)
+    cached = _loggers.get(name)
+    if cached is not None and cached[0] == args and cached[1] == tuple(logger.handlers):
+        return logger
+    setup_logger(name, log_path, level, console, as_json)
+    _loggers[name] = (args, tuple(logger.handlers))
+    return logger
+
+def log_event(logger, level, event, **fields):
+    """Emit a structured event; nothing is formatted unless the level is enabled."""
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
+
+def tail_lines(path, n=10, block_size=4096):
+    """Last n lines of a file, read backwards from the end instead of loading it whole."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b""
+        while pos > 0 and data.count(b"\n") <= n:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    lines = data.decode("utf-8", errors="replace").splitlines(keepends=True)
+    return lines[-n:]
+
+def print_last_log_lines(log_path, n=10):
+    if not os.path.exists(log_path):
+        print("No log file found.")
+        return
+    print("".join(tail_lines(log_path, n)))
@@ -0,0 +1,116 @@
+# manifest.py
+
+import os
+import json
+import hashlib
+from datetime import datetime
+
+from order_store import split_ref
+
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def file_fingerprint(path):
+    """Size, mtime and content hash of path. The stat is taken before the hash, so a write
+    that lands while the file is read leaves a newer mtime and the next run hashes it again."""
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime": st.st_mtime, "sha256": file_digest(path)}
+
+def config_hash(config_paths, parser_version):
+    """Hash the parser version together with the raw bytes of every config file it reads."""
+    h = hashlib.sha256(str(parser_version).encode("utf-8"))
+    for path in config_paths:
+        h.update(path.encode("utf-8"))
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                h.update(f.read())
+    return h.hexdigest()
+
+def output_exists(output):
+    # Store refs only need the store file; the parse that produced them replaces them on re-parse
+    ref = split_ref(output)
+    return os.path.exists(ref[0] if ref else output)
+
+class Manifest:
+    """Per-input record of size, mtime, content hash, parser version and config hash.
+
+    An input only needs re-parsing when its content, its parser version or its
+    retailer's config changed, or when one of the outputs it produced is missing.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.entries = json.load(f).get("files", {})
+            except (OSError, ValueError):
+                self.entries = {}
+
+    @staticmethod
+    def _key(file_path):
+        return os.path.normpath(file_path)
+
+    def fingerprint(self, file_path):
+        st = os.stat(file_path)
+        entry = self.entries.get(self._key(file_path))
+        # Size and mtime unchanged: trust the stored hash instead of re-reading the file
+        if entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+            return {"size": st.st_size, "mtime": st.st_mtime, "sha256": entry["sha256"]}
+        return file_fingerprint(file_path)
+
+    def is_current(self, file_path, parser_version, cfg_hash):
+        entry = self.entries.get(self._key(file_path))
+        if not entry:
+            return False
+        if entry["parser_version"] != parser_version or entry["config_hash"] != cfg_hash:
+            return False
+        fp = self.fingerprint(file_path)
+        if fp["sha256"] != entry["sha256"]:
+            return False
+        if not all(output_exists(p) for p in entry.get("outputs", [])):
+            return False
+        # Content unchanged but the file was touched: remember the new stat so
+        # the next run does not hash it again
+        entry["size"], entry["mtime"] = fp["size"], fp["mtime"]
+        return True
+
+    def record(self, file_path, retailer, parser_version, cfg_hash, outputs, fingerprint=None):
+        """Remember a parse. fingerprint is the input's size, mtime and hash taken before it
+        was parsed (run_one's result has it), so an input rewritten during the parse still
+        looks changed next time; without it the file is fingerprinted now."""
+        key = self._key(file_path)
+        previous = self.entries.get(key, {}).get("outputs", [])
+        stale = [p for p in previous if p not in outputs and not split_ref(p) and os.path.exists(p)]
+        for p in stale:
+            os.remove(p)
+
+        entry = dict(fingerprint) if fingerprint else self.fingerprint(file_path)
+        entry.update({
+            "retailer": retailer,
+            "parser_version": parser_version,
+            "config_hash": cfg_hash,
+            "outputs": list(outputs),
+            "parsed_at": datetime.now().isoformat(timespec="seconds"),
+        })
+        self.entries[key] = entry
+        return stale
+
+    def forget(self, file_path):
+        self.entries.pop(self._key(file_path), None)
+
+    def prune(self):
+        for key in [k for k in self.entries if not os.path.exists(k)]:
+            del self.entries[key]
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.entries}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
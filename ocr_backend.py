@@ -0,0 +1,207 @@
+# ocr_backend.py
+#
+# OCR engines behind one interface, so the Co.op parser can keep tesseract's
+# model loaded instead of paying process start-up and model load per image:
+#
+#   tesserocr    in-process libtesseract API, one engine per thread kept for
+#                the life of the process (pip install tesserocr)
+#   pytesseract  the tesseract CLI; single images as before, batches in one
+#                process run over a list file
+#
+# get_backend("auto") prefers tesserocr and falls back to pytesseract.
+# DXF_OCR_BACKEND overrides the configured choice.
+
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import cv2
+import pytesseract
+
+TESSERACT_LANG = "eng"
+TESSERACT_OEM = 3
+TESSERACT_PSM = 6
+TESSERACT_CONFIG = f"--oem {TESSERACT_OEM} --psm {TESSERACT_PSM}"
+
+# Column header of tesseract's TSV output; the API's GetTSVText leaves it out
+TSV_HEADER = "\t".join([
+    "level", "page_num", "block_num", "par_num", "line_num", "word_num",
+    "left", "top", "width", "height", "conf", "text",
+])
+
+BACKENDS = ("auto", "tesserocr", "pytesseract")
+
+def words_from_tsv(tsv):
+    """image_to_data-style dict from TSV text, typed exactly as pytesseract does it."""
+    return pytesseract.pytesseract.file_to_dict(tsv, "\t", -1)
+
+def renumber_page(words):
+    # Every image of a batch is reported as page 1, as a single run would
+    if "page_num" in words:
+        words["page_num"] = [1] * len(words["page_num"])
+    return words
+
+class PytesseractBackend:
+    """The tesseract CLI: one process per image, or one process for a whole batch."""
+
+    name = "pytesseract"
+
+    def version(self):
+        return str(pytesseract.get_tesseract_version())
+
+    def recognize(self, image):
+        """Plain text and word boxes (image_to_data dict) from a single tesseract run."""
+        tess = pytesseract.pytesseract
+        with tess.save(image) as (temp_name, input_filename):
+            tess.run_tesseract(input_filename, temp_name, "txt tsv", TESSERACT_LANG,
+                               f"{TESSERACT_CONFIG} -c tessedit_create_tsv=1")
+            with open(f"{temp_name}.txt", "rb") as f:
+                text = f.read().decode("utf-8")
+            with open(f"{temp_name}.tsv", "rb") as f:
+                words = words_from_tsv(f.read().decode("utf-8"))
+        return {"text": text, "words": words}
+
+    def recognize_many(self, images, workers):
+        # Each call is its own subprocess, so threads are enough to use every core
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(images)))) as pool:
+            return list(pool.map(self.recognize, images))
+
+    def recognize_batch(self, images):
+        """Results for many images from one tesseract process (the model is loaded once).
+
+        The images are written to a temp folder and passed as a list file;
+        tesseract separates the pages' text with form feeds and numbers the
+        TSV rows by page, which is how the output is split back per image.
+        """
+        if len(images) < 2:
+            return [self.recognize(image) for image in images]
+        temp_dir = tempfile.mkdtemp(prefix="tess_batch_")
+        try:
+            names = []
+            for i, image in enumerate(images):
+                name = os.path.join(temp_dir, f"{i:05d}.png")
+                cv2.imwrite(name, image)
+                names.append(name)
+            list_file = os.path.join(temp_dir, "images.txt")
+            with open(list_file, "w", encoding="utf-8") as f:
+                f.write("\n".join(names) + "\n")
+
+            out = os.path.join(temp_dir, "out")
+            pytesseract.pytesseract.run_tesseract(list_file, out, "txt tsv", TESSERACT_LANG,
+                                                  f"{TESSERACT_CONFIG} -c tessedit_create_tsv=1")
+            with open(f"{out}.txt", "rb") as f:
+                text = f.read().decode("utf-8")
+            with open(f"{out}.tsv", "rb") as f:
+                tsv_lines = f.read().decode("utf-8").splitlines()
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        # Older tesseract ends every page with the separator, newer ones only put it between pages;
+        # each image gets back whatever a single run of the same binary would have produced
+        suffix = "\f" if text.endswith("\f") else ""
+        pages = text[:-1].split("\f") if suffix else text.split("\f")
+        if len(pages) != len(images):
+            raise RuntimeError(f"tesseract returned {len(pages)} pages for {len(images)} images")
+        by_page = {}
+        for line in tsv_lines[1:]:
+            page = line.split("\t", 2)[1] if "\t" in line else ""
+            if page.isdigit():
+                by_page.setdefault(int(page), []).append(line)
+        return [
+            {"text": pages[i] + suffix,
+             "words": renumber_page(words_from_tsv("\n".join([tsv_lines[0]] + by_page.get(i + 1, []))))}
+            for i in range(len(images))
+        ]
+
+    def close(self):
+        pass
+
+class TesserocrBackend:
+    """libtesseract in-process: each thread keeps its own initialised engine between images."""
+
+    name = "tesserocr"
+
+    def __init__(self):
+        import tesserocr
+        self.tesserocr = tesserocr
+        self.local = threading.local()
+        self.apis = []
+        self.lock = threading.Lock()
+        self.pool = None
+        self.pool_workers = 0
+
+    def version(self):
+        return self.tesserocr.tesseract_version().split()[1]
+
+    def api(self):
+        api = getattr(self.local, "api", None)
+        if api is None:
+            api = self.tesserocr.PyTessBaseAPI(lang=TESSERACT_LANG, psm=TESSERACT_PSM, oem=TESSERACT_OEM)
+            self.local.api = api
+            with self.lock:
+                self.apis.append(api)
+        return api
+
+    def recognize(self, image):
+        from PIL import Image
+        api = self.api()
+        api.SetImage(Image.fromarray(image))
+        # Same shape as the CLI's txt output: the page text ends with a form feed
+        text = api.GetUTF8Text() + "\f"
+        words = words_from_tsv(TSV_HEADER + "\n" + api.GetTSVText(0))
+        api.Clear()
+        return {"text": text, "words": words}
+
+    def recognize_many(self, images, workers):
+        # tesserocr releases the GIL while recognising; a long-lived pool keeps
+        # each thread's engine (and loaded model) across calls
+        with self.lock:
+            if self.pool is None or self.pool_workers < workers:
+                if self.pool is not None:
+                    self.pool.shutdown(wait=True)
+                self.pool_workers = max(1, workers)
+                self.pool = ThreadPoolExecutor(max_workers=self.pool_workers, thread_name_prefix="tesserocr")
+        return list(self.pool.map(self.recognize, images))
+
+    def recognize_batch(self, images):
+        return [self.recognize(image) for image in images]
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
+            self.pool_workers = 0
+        with self.lock:
+            for api in self.apis:
+                api.End()
+            self.apis = []
+
+@lru_cache(maxsize=None)
+def tesserocr_available():
+    try:
+        import tesserocr  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_backend(name="auto"):
+    """The process-wide backend for a name ("auto", "tesserocr" or "pytesseract").
+
+    "auto" (and "tesserocr" when the binding is not installed) falls back to
+    pytesseract.
+    """
+    name = os.environ.get("DXF_OCR_BACKEND") or name or "auto"
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown OCR backend {name!r}; expected one of {', '.join(BACKENDS)}")
+    if name in ("auto", "tesserocr"):
+        name = "tesserocr" if tesserocr_available() else "pytesseract"
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = TesserocrBackend() if name == "tesserocr" else PytesseractBackend()
+        return _backends[name]
@@ -0,0 +1,99 @@
+# ocr_cache.py
+
+import os
+import json
+import hashlib
+
+# Puts between directory scans when the running total stays under the limit;
+# the scan picks up entries other processes wrote to the same folder meanwhile
+RESCAN_PUTS = 256
+# Eviction trims to this fraction of max_bytes, leaving room for the next puts
+EVICT_TO = 0.9
+
+class OcrCache:
+    """On-disk store of raw OCR results, one JSON file per key, bounded to max_bytes.
+
+    Keys combine the image content hash with every preprocessing and tesseract
+    setting, so changing any of them misses instead of returning stale text.
+    Hits refresh the entry's mtime and eviction removes the least recently
+    used entries first, down to EVICT_TO of the limit. The folder's size is
+    kept as a running total, so a put only scans the folder (and evicts) once
+    the total passes max_bytes, or every RESCAN_PUTS puts, not on every write.
+    """
+
+    def __init__(self, cache_dir, max_bytes=200 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.total = None          # bytes in cache_dir at the last scan plus puts since
+        self.puts_since_scan = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(image_bytes, params):
+        h = hashlib.sha256(hashlib.sha256(image_bytes).digest())
+        h.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+            size = f.tell()
+        os.replace(tmp_path, path)
+        if self.total is None or self.puts_since_scan >= RESCAN_PUTS:
+            self.evict()
+            return
+        self.total += size - replaced
+        self.puts_since_scan += 1
+        if self.total > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, entry.path))
+            total += st.st_size
+        self.total, self.puts_since_scan = total, 0
+        if total <= self.max_bytes:
+            return 0
+
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes * EVICT_TO:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        self.total = total
+        return removed
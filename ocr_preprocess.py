@@ -0,0 +1,110 @@
+# ocr_preprocess.py
+
+import cv2
+import numpy as np
+
+# Everything that changes what tesseract sees; part of the OCR cache key
+PREPROCESS_PARAMS = {
+    "red_ranges": [[[0, 50, 50], [10, 255, 255]], [[160, 50, 50], [180, 255, 255]]],
+    "blur_kernel": 3,
+    "sharpen": [1.5, -0.5],
+    "thresh_block": 11,
+    "thresh_c": 2,
+}
+
+# Margin trim: anything darker than this is content, the rest is page background
+MARGIN_LEVEL = 250
+MARGIN_PAD = 4
+
+def load_image(source):
+    if isinstance(source, (bytes, bytearray)):
+        return cv2.imdecode(np.frombuffer(source, dtype=np.uint8), cv2.IMREAD_COLOR)
+    return cv2.imread(str(source))
+
+class Preprocessor:
+    """Red-text masking, sharpening and adaptive threshold with reusable working buffers.
+
+    Every intermediate (HSV, masks, gray, blur, sharpened, threshold) is
+    written with dst= into buffers owned by the instance, so after the first
+    image of a given size nothing is allocated per image. Buffers only grow,
+    which lets a batch of differently sized screenshots share one set.
+
+    run() returns a view of the threshold buffer: it is overwritten by the
+    next call, so copy it if it has to outlive that. One instance per thread.
+    """
+
+    def __init__(self, params=None, trim_margin=False):
+        self.params = params or PREPROCESS_PARAMS
+        self.trim_margin = trim_margin
+        self.red_ranges = [
+            (np.array(lo, dtype=np.uint8), np.array(hi, dtype=np.uint8))
+            for lo, hi in self.params["red_ranges"]
+        ]
+        k = self.params["blur_kernel"]
+        self.blur_kernel = (k, k)
+        self._buffers = {}
+
+    def buffer(self, name, shape):
+        """Contiguous uint8 array of the given shape, carved out of a grow-only flat buffer."""
+        size = int(np.prod(shape))
+        flat = self._buffers.get(name)
+        if flat is None or flat.size < size:
+            flat = np.empty(size, dtype=np.uint8)
+            self._buffers[name] = flat
+        return flat[:size].reshape(shape)
+
+    def table_region(self, image):
+        """Row and column slices of the non-background area, so margins skip the expensive steps."""
+        height, width = image.shape[:2]
+        probe = self.buffer("probe", (height, width))
+        cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=probe)
+        cv2.threshold(probe, MARGIN_LEVEL, 255, cv2.THRESH_BINARY_INV, dst=probe)
+        x, y, w, h = cv2.boundingRect(probe)
+        if w == 0 or h == 0:
+            return slice(0, height), slice(0, width)
+        return (slice(max(y - MARGIN_PAD, 0), min(y + h + MARGIN_PAD, height)),
+                slice(max(x - MARGIN_PAD, 0), min(x + w + MARGIN_PAD, width)))
+
+    def run(self, image):
+        if self.trim_margin:
+            rows, cols = self.table_region(image)
+            region = image[rows, cols]
+            image = self.buffer("region", region.shape)
+            np.copyto(image, region)
+        height, width = image.shape[:2]
+
+        hsv = self.buffer("hsv", (height, width, 3))
+        red = self.buffer("red", (height, width))
+        red2 = self.buffer("red2", (height, width))
+        gray = self.buffer("gray", (height, width))
+        blur = self.buffer("blur", (height, width))
+        sharp = self.buffer("sharp", (height, width))
+        thresh = self.buffer("thresh", (height, width))
+
+        # Mask red text, then invert so a single AND forces it to black in gray
+        cv2.cvtColor(image, cv2.COLOR_BGR2HSV, dst=hsv)
+        (lo1, hi1), (lo2, hi2) = self.red_ranges
+        cv2.inRange(hsv, lo1, hi1, dst=red)
+        cv2.inRange(hsv, lo2, hi2, dst=red2)
+        cv2.bitwise_or(red, red2, dst=red)
+        cv2.bitwise_not(red, dst=red)
+
+        cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=gray)
+        cv2.bitwise_and(gray, red, dst=gray)
+
+        # Sharpen and threshold
+        cv2.GaussianBlur(gray, self.blur_kernel, 0, dst=blur)
+        alpha, beta = self.params["sharpen"]
+        cv2.addWeighted(gray, alpha, blur, beta, 0, dst=sharp)
+        cv2.adaptiveThreshold(sharp, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
+                              self.params["thresh_block"], self.params["thresh_c"], dst=thresh)
+        return thresh
+
+    def batch(self, sources):
+        """Yield (source, thresholded image) for each path or bytes, all through one set of buffers."""
+        for source in sources:
+            image = load_image(source)
+            if image is None:
+                yield source, None
+                continue
+            yield source, self.run(image)
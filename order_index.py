@@ -0,0 +1,187 @@
+# order_index.py
+#
+# Which orders exist for a delivery day, and where they are, without opening
+# any output JSON. The order store keeps a record_index table (one row per
+# stored record: delivery date, retailer, store, order slip, order type,
+# source file, line count and total qty) that save_records updates in the
+# same transaction as the lines, so it is never behind the store. Lookups go
+# through indexes on delivery_date and cost the same however many days the
+# store holds.
+#
+#   python order_index.py day 2025-07-10                  # every order for the day
+#   python order_index.py day 2025-07-10 --retailer lotte --store "LOTTE MART"
+#   python order_index.py totals 2025-07-10 --by retailer
+#   python order_index.py dates --from 2025-07-01
+#   python order_index.py rebuild                         # recompute the index from the store
+
+import os
+import sys
+import time
+import argparse
+
+import order_store
+from order_store import RETAILERS, connect, make_ref, store_path
+
+INDEX_COLUMNS = ["delivery_date", "retailer", "store", "order_slip", "order_type",
+                 "source_file", "record_key", "lines", "qty"]
+
+# Totals group by these (besides the day); each maps to order_lines columns
+TOTALS_BY = {
+    "product": ["product_name"],
+    "retailer": ["retailer"],
+    "retailer_product": ["retailer", "product_name"],
+    "store": ["retailer", "store"],
+}
+
+def _filters(column, values):
+    values = [values] if isinstance(values, str) else list(values or [])
+    if not values:
+        return "", []
+    return f" AND {column} IN ({', '.join('?' * len(values))})", values
+
+def _open(path_config):
+    path = store_path(path_config)
+    return (connect(path), path) if os.path.exists(path) else (None, path)
+
+def json_location(path_config, retailer, record_key):
+    output_dir = path_config.get(f"output_{retailer}")
+    if not output_dir:
+        return None
+    path = os.path.join(output_dir, f"{record_key}.json")
+    return path if os.path.exists(path) else None
+
+def day_orders(path_config, date, retailers=None, stores=None, order_slips=None):
+    """Every stored record delivered on date, as dicts of INDEX_COLUMNS plus where to find it:
+    "ref" (the store ref the manifest uses) and "json" (the output file, when there is one)."""
+    conn, path = _open(path_config)
+    if conn is None:
+        return []
+    sql = f"SELECT {', '.join(INDEX_COLUMNS)} FROM record_index WHERE delivery_date = ?"
+    params = [date]
+    for column, values in (("retailer", retailers), ("store", stores), ("order_slip", order_slips)):
+        clause, extra = _filters(column, values)
+        sql += clause
+        params += extra
+    try:
+        rows = conn.execute(sql + " ORDER BY retailer, store, order_slip, record_key", params).fetchall()
+    finally:
+        conn.close()
+    orders = []
+    for row in rows:
+        order = dict(zip(INDEX_COLUMNS, row))
+        order["ref"] = make_ref(path, order["retailer"], order["record_key"])
+        order["json"] = json_location(path_config, order["retailer"], order["record_key"])
+        orders.append(order)
+    return orders
+
+def day_totals(path_config, date, by="product", retailers=None, include_forecast=False):
+    """qty, amount and line count per group for one delivery day, summed in SQLite.
+
+    Forecast (DU KIEN) lines are left out unless include_forecast, as in consolidate.py.
+    """
+    keys = TOTALS_BY[by]
+    conn, _ = _open(path_config)
+    if conn is None:
+        return []
+    sql = (f"SELECT {', '.join(keys)}, TOTAL(qty), TOTAL(qty * unit_price), COUNT(*) "
+           "FROM order_lines WHERE delivery_date = ?")
+    params = [date]
+    clause, extra = _filters("retailer", retailers)
+    sql += clause
+    params += extra
+    if not include_forecast:
+        sql += " AND order_type != 'forecast'"
+    sql += f" GROUP BY {', '.join(keys)} ORDER BY {', '.join(keys)}"
+    try:
+        rows = conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+    return [dict(zip(keys + ["qty", "amount", "lines"], row)) for row in rows]
+
+def delivery_dates(path_config, start=None, end=None, retailers=None):
+    """[(date, records, lines)] for every delivery day in the store, optionally within [start, end]."""
+    conn, _ = _open(path_config)
+    if conn is None:
+        return []
+    sql = "SELECT delivery_date, COUNT(*), SUM(lines) FROM record_index WHERE delivery_date IS NOT NULL"
+    params = []
+    if start:
+        sql += " AND delivery_date >= ?"
+        params.append(start)
+    if end:
+        sql += " AND delivery_date <= ?"
+        params.append(end)
+    clause, extra = _filters("retailer", retailers)
+    sql += clause + " GROUP BY delivery_date ORDER BY delivery_date"
+    try:
+        return conn.execute(sql, params + extra).fetchall()
+    finally:
+        conn.close()
+
+def rebuild(path_config):
+    conn, _ = _open(path_config)
+    if conn is None:
+        return 0
+    try:
+        with conn:
+            order_store.rebuild_index(conn)
+        return conn.execute("SELECT COUNT(*) FROM record_index").fetchone()[0]
+    finally:
+        conn.close()
+
+def fmt_qty(value):
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Look up stored orders by delivery date.")
+    parser.add_argument("--paths", default="config/paths.json", help="Path config file")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    day = sub.add_parser("day", help="Every order delivered on a date, with where it is stored")
+    day.add_argument("date")
+    day.add_argument("--retailer", action="append", choices=RETAILERS, help="Only this retailer (repeatable)")
+    day.add_argument("--store", action="append", help="Only this store/warehouse (repeatable)")
+    day.add_argument("--slip", action="append", help="Only this order slip (repeatable)")
+
+    tot = sub.add_parser("totals", help="Quantities for a date, grouped")
+    tot.add_argument("date")
+    tot.add_argument("--by", choices=sorted(TOTALS_BY), default="product")
+    tot.add_argument("--retailer", action="append", choices=RETAILERS, help="Only this retailer (repeatable)")
+    tot.add_argument("--include-forecast", action="store_true", help="Count DU KIEN forecast orders")
+
+    dates = sub.add_parser("dates", help="Delivery days in the store with record and line counts")
+    dates.add_argument("--from", dest="start")
+    dates.add_argument("--to", dest="end")
+    dates.add_argument("--retailer", action="append", choices=RETAILERS, help="Only this retailer (repeatable)")
+
+    sub.add_parser("rebuild", help="Recompute the index from the stored records")
+    args = parser.parse_args(argv)
+
+    path_config = order_store.load_path_config(args.paths)
+    start = time.perf_counter()
+    if args.command == "day":
+        orders = day_orders(path_config, args.date, args.retailer, args.store, args.slip)
+        for o in orders:
+            where = o["json"] or o["ref"]
+            print(f"{o['retailer']:<13} {o['order_type']:<10} {o['store'] or '-':<28} {o['order_slip'] or '-':<22} "
+                  f"{o['lines']:>4} lines  qty {fmt_qty(o['qty']):>8}  {where}")
+        summary = f"{len(orders)} orders"
+    elif args.command == "totals":
+        totals = day_totals(path_config, args.date, args.by, args.retailer, args.include_forecast)
+        keys = TOTALS_BY[args.by]
+        for t in totals:
+            label = " / ".join(str(t[k]) if t[k] is not None else "-" for k in keys)
+            print(f"{label:<50} qty {fmt_qty(t['qty']):>9}  amount {t['amount']:>14,.0f}  {t['lines']:>4} lines")
+        summary = f"{len(totals)} groups"
+    elif args.command == "dates":
+        found = delivery_dates(path_config, args.start, args.end, args.retailer)
+        for date, records, lines in found:
+            print(f"{date}  {records:>4} records  {lines:>6} lines")
+        summary = f"{len(found)} days"
+    else:
+        summary = f"{rebuild(path_config)} records indexed"
+    print(f"{summary} ({(time.perf_counter() - start) * 1000:.1f} ms)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,396 @@
+# order_store.py
+#
+# One SQLite file holding every parsed order line, so consolidation and
+# reporting read a single table instead of opening one JSON per order.
+#
+#   python order_store.py import-json              # load existing output/<retailer>/*.json
+#   python order_store.py export --date 2025-07-10 # write JSON back out on demand
+
+import os
+import sys
+import json
+import glob
+import sqlite3
+import argparse
+from datetime import datetime
+
+from order_rows import ROW_FIELDS, OrderRow, row_values, write_record
+
+RETAILERS = ["cb", "satra", "smile_cheers", "lotte", "mini", "genshai", "coop"]
+
+DEFAULT_STORE = "output/orders.sqlite"
+
+# Shared schema for every retailer's rows; header fields are repeated per line
+# so a date or retailer scan needs no join
+LINE_COLUMNS = [
+    "delivery_date", "retailer", "store", "order_slip", "order_type",
+    "source_file", "product_name", "qty", "unit_price", "tax",
+]
+
+# qty/unit_price/tax are declared without a type so SQLite keeps ints as ints
+# and floats as floats, and exported JSON matches what the parser produced
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    retailer      TEXT NOT NULL,
+    record_key    TEXT NOT NULL,
+    source_file   TEXT,
+    delivery_date TEXT,
+    header        TEXT NOT NULL,
+    saved_at      TEXT,
+    PRIMARY KEY (retailer, record_key)
+);
+CREATE TABLE IF NOT EXISTS order_lines (
+    delivery_date TEXT,
+    retailer      TEXT NOT NULL,
+    store         TEXT,
+    order_slip    TEXT,
+    order_type    TEXT,
+    source_file   TEXT,
+    record_key    TEXT NOT NULL,
+    line_no       INTEGER NOT NULL,
+    product_name  TEXT,
+    qty,
+    unit_price,
+    tax
+);
+CREATE INDEX IF NOT EXISTS order_lines_by_date ON order_lines (delivery_date, retailer);
+CREATE INDEX IF NOT EXISTS order_lines_by_source ON order_lines (retailer, source_file);
+CREATE INDEX IF NOT EXISTS order_lines_by_record ON order_lines (retailer, record_key);
+CREATE INDEX IF NOT EXISTS records_by_source ON records (retailer, source_file);
+CREATE TABLE IF NOT EXISTS record_index (
+    delivery_date TEXT,
+    retailer      TEXT NOT NULL,
+    store         TEXT,
+    order_slip    TEXT,
+    order_type    TEXT,
+    source_file   TEXT,
+    record_key    TEXT NOT NULL,
+    lines         INTEGER NOT NULL,
+    qty           REAL NOT NULL,
+    PRIMARY KEY (retailer, record_key)
+);
+CREATE INDEX IF NOT EXISTS record_index_by_date ON record_index (delivery_date, retailer, store, order_slip);
+CREATE INDEX IF NOT EXISTS record_index_by_source ON record_index (retailer, source_file);
+"""
+
+# Stores written before record_index existed are backfilled once; tracked in PRAGMA user_version
+INDEX_VERSION = 1
+
+FORECAST_KEYWORD = "DU KIEN"
+CONFIRMED_KEYWORD = "CHOT"
+
+# Manifest output entries for stored records look like "<store path>::<retailer>/<record key>"
+REF_SEPARATOR = "::"
+
+def load_path_config(path="config/paths.json"):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["paths"]
+
+def store_path(path_config):
+    return path_config.get("order_store", DEFAULT_STORE)
+
+def json_enabled(path_config):
+    return bool(path_config.get("write_json", False))
+
+def json_compact(path_config):
+    # Single-line JSON without indentation: smaller and faster to write, same content
+    return bool(path_config.get("json_compact", False))
+
+def order_type_of(record):
+    if record.get("type"):
+        return record["type"]
+    name = str(record.get("source_file", "")).upper()
+    if FORECAST_KEYWORD in name:
+        return "forecast"
+    if CONFIRMED_KEYWORD in name:
+        return "confirmed"
+    return "unknown"
+
+def connect(path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Parsers run in parallel processes: WAL lets readers continue during a
+    # write and the timeout makes writers queue instead of failing
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    if conn.execute("PRAGMA user_version").fetchone()[0] < INDEX_VERSION:
+        with conn:
+            rebuild_index(conn)
+            conn.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+    return conn
+
+def make_ref(path, retailer, record_key):
+    return f"{path}{REF_SEPARATOR}{retailer}/{record_key}"
+
+def split_ref(ref):
+    """(store path, retailer, record key) for a store ref, or None for a plain file path."""
+    if REF_SEPARATOR not in ref:
+        return None
+    path, key = ref.split(REF_SEPARATOR, 1)
+    retailer, record_key = key.split("/", 1)
+    return path, retailer, record_key
+
+def json_path(output_dir, record_key):
+    return os.path.join(output_dir, f"{record_key}.json")
+
+def write_json(record, output_path, compact=False):
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        write_record(f, record, compact=compact)
+    return output_path
+
+def _index_record(conn, retailer, record_key, record):
+    """(Re)write one record's row in record_index from its header and its stored lines."""
+    conn.execute(
+        "INSERT OR REPLACE INTO record_index "
+        "SELECT ?, ?, ?, ?, ?, ?, ?, COUNT(*), TOTAL(qty) FROM order_lines WHERE retailer = ? AND record_key = ?",
+        (record.get("delivery_date"), retailer, record.get("store"), record.get("order_slip"),
+         order_type_of(record), record.get("source_file"), record_key, retailer, record_key),
+    )
+
+def rebuild_index(conn):
+    """Recompute record_index from the records and order_lines tables."""
+    conn.execute("DELETE FROM record_index")
+    for retailer, record_key, header in conn.execute("SELECT retailer, record_key, header FROM records").fetchall():
+        _index_record(conn, retailer, record_key, json.loads(header))
+
+def _replace(conn, retailer, source_files, records, on_saved=None, clear_sources=False):
+    """Insert records after dropping what source_files stored before.
+
+    With clear_sources, each record's own source_file is also cleared the
+    first time it is seen, so records can be a generator that is consumed
+    once. on_saved(record_key, record) is called after each record is inserted.
+    """
+    cleared = set()
+
+    def clear(source_file):
+        conn.execute("DELETE FROM order_lines WHERE retailer = ? AND source_file = ?", (retailer, source_file))
+        conn.execute("DELETE FROM records WHERE retailer = ? AND source_file = ?", (retailer, source_file))
+        conn.execute("DELETE FROM record_index WHERE retailer = ? AND source_file = ?", (retailer, source_file))
+        cleared.add(source_file)
+
+    for source_file in source_files:
+        clear(source_file)
+
+    saved_at = datetime.now().isoformat(timespec="seconds")
+    for record_key, record in records:
+        if clear_sources and record.get("source_file") and record["source_file"] not in cleared:
+            clear(record["source_file"])
+        # The header keeps the record's own key order (rows included as a
+        # placeholder) so an export reproduces the parser's JSON exactly
+        header = {k: (None if k == "rows" else v) for k, v in record.items()}
+        conn.execute(
+            "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?)",
+            (retailer, record_key, record.get("source_file"), record.get("delivery_date"),
+             json.dumps(header, ensure_ascii=False), saved_at),
+        )
+        conn.execute("DELETE FROM order_lines WHERE retailer = ? AND record_key = ?", (retailer, record_key))
+        head = (record.get("delivery_date"), retailer, record.get("store"), record.get("order_slip"),
+                order_type_of(record), record.get("source_file"), record_key)
+        conn.executemany(
+            "INSERT INTO order_lines (delivery_date, retailer, store, order_slip, order_type, source_file, "
+            "record_key, line_no, product_name, qty, unit_price, tax) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (head + (line_no,) + row_values(row) for line_no, row in enumerate(record.get("rows") or [])),
+        )
+        _index_record(conn, retailer, record_key, record)
+        if on_saved is not None:
+            on_saved(record_key, record)
+
+def save_records(path_config, retailer, records, source_file=None):
+    """Store one input's normalised records, replacing whatever that input stored before.
+
+    records is an iterable of (record_key, record) pairs; the key is the name
+    the record's JSON file has always had, without ".json". It is consumed
+    once, so a generator (Lotte) is saved as it is produced and only one
+    record is held at a time. Rows from earlier parses of the same source
+    file are dropped in the same transaction, so a re-parse never leaves
+    duplicates. When write_json is set (off by default) each record is also
+    written to output_<retailer>/<record_key>.json, indented unless
+    json_compact is set. The JSON is written to temp files during the
+    transaction and only moved into place once it has committed, so a
+    rolled-back save leaves the previous JSON untouched.
+
+    Returns the outputs for the manifest: JSON paths plus one store ref per record.
+    """
+    path = store_path(path_config)
+    keys = []
+    staged = {}   # final JSON path -> temp file holding it until the commit
+    output_dir = path_config[f"output_{retailer}"] if json_enabled(path_config) else None
+    compact = json_compact(path_config)
+
+    def saved(record_key, record):
+        keys.append(record_key)
+        if output_dir is not None:
+            final = json_path(output_dir, record_key)
+            staged[final] = write_json(record, f"{final}.{os.getpid()}.tmp", compact)
+
+    conn = connect(path)
+    try:
+        with conn:
+            _replace(conn, retailer, [source_file] if source_file else [], records, saved, clear_sources=True)
+    except BaseException:
+        for tmp in staged.values():
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+        raise
+    finally:
+        conn.close()
+    for final, tmp in staged.items():
+        os.replace(tmp, final)
+    return list(staged) + [make_ref(path, retailer, key) for key in keys]
+
+def delete_source(path_config, retailer, source_file):
+    """Drop everything stored for one input, e.g. when its latest parse produced nothing."""
+    path = store_path(path_config)
+    if not os.path.exists(path):
+        return
+    conn = connect(path)
+    try:
+        with conn:
+            _replace(conn, retailer, [source_file], [])
+    finally:
+        conn.close()
+
+def source_dates(path_config, retailer, source_file):
+    """Delivery dates of everything currently stored for one input."""
+    path = store_path(path_config)
+    if not os.path.exists(path):
+        return set()
+    conn = connect(path)
+    try:
+        rows = conn.execute("SELECT DISTINCT delivery_date FROM records WHERE retailer = ? AND source_file = ?",
+                            (retailer, source_file)).fetchall()
+    finally:
+        conn.close()
+    return {date for date, in rows if date}
+
+def record_dates(refs):
+    """Delivery dates of the records behind a list of store refs."""
+    wanted = {}
+    for ref in refs:
+        parts = split_ref(ref)
+        if parts:
+            wanted.setdefault(parts[0], []).append(parts[1:])
+
+    dates = set()
+    for path, keys in wanted.items():
+        if not os.path.exists(path):
+            continue
+        conn = connect(path)
+        try:
+            for retailer, record_key in keys:
+                row = conn.execute("SELECT delivery_date FROM records WHERE retailer = ? AND record_key = ?",
+                                   (retailer, record_key)).fetchone()
+                if row and row[0]:
+                    dates.add(row[0])
+        finally:
+            conn.close()
+    return dates
+
+def _where(dates=None, retailers=None):
+    clauses, params = [], []
+    if dates:
+        clauses.append(f"delivery_date IN ({', '.join('?' * len(dates))})")
+        params += list(dates)
+    if retailers:
+        clauses.append(f"retailer IN ({', '.join('?' * len(retailers))})")
+        params += list(retailers)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+def read_lines(path, dates=None, retailers=None):
+    """All stored order lines (optionally only some dates/retailers) as one DataFrame, in one query."""
+    import pandas as pd
+
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=LINE_COLUMNS)
+    where, params = _where(dates, retailers)
+    conn = connect(path)
+    try:
+        return pd.read_sql_query(
+            f"SELECT {', '.join(LINE_COLUMNS)} FROM order_lines{where} "
+            f"ORDER BY delivery_date, retailer, record_key, line_no",
+            conn, params=params,
+        )
+    finally:
+        conn.close()
+
+def iter_stored_records(path, dates=None, retailers=None):
+    """Rebuild (retailer, record_key, record) exactly as the parsers produced them."""
+    if not os.path.exists(path):
+        return
+    where, params = _where(dates, retailers)
+    conn = connect(path)
+    try:
+        records = conn.execute(
+            f"SELECT retailer, record_key, header FROM records{where} ORDER BY retailer, record_key", params
+        ).fetchall()
+        for retailer, record_key, header in records:
+            record = json.loads(header)
+            lines = conn.execute(
+                f"SELECT {', '.join(ROW_FIELDS)} FROM order_lines "
+                "WHERE retailer = ? AND record_key = ? ORDER BY line_no",
+                (retailer, record_key),
+            )
+            record["rows"] = [OrderRow(*line) for line in lines]
+            yield retailer, record_key, record
+    finally:
+        conn.close()
+
+def export_json(path_config, output_dir=None, dates=None, retailers=None):
+    written = []
+    for retailer, record_key, record in iter_stored_records(store_path(path_config), dates, retailers):
+        target = os.path.join(output_dir, retailer) if output_dir else path_config[f"output_{retailer}"]
+        written.append(write_json(record, json_path(target, record_key), json_compact(path_config)))
+    return written
+
+def import_json(path_config, retailers=None):
+    """Load existing output/<retailer>/*.json into the store, one transaction per retailer."""
+    path = store_path(path_config)
+    conn = connect(path)
+    total = 0
+    try:
+        for retailer in retailers or RETAILERS:
+            output_dir = path_config.get(f"output_{retailer}")
+            if not output_dir:
+                continue
+            records = []
+            for json_path in sorted(glob.glob(os.path.join(output_dir, "*.json"))):
+                try:
+                    with open(json_path, encoding="utf-8") as f:
+                        records.append((os.path.splitext(os.path.basename(json_path))[0], json.load(f)))
+                except (OSError, ValueError) as e:
+                    print(f"[WARN] Skipping unreadable output {json_path}: {e}")
+            with conn:
+                _replace(conn, retailer, [], records)
+            total += len(records)
+    finally:
+        conn.close()
+    return total
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import into or export from the order store.")
+    parser.add_argument("--paths", default="config/paths.json", help="Path config file")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    exp = sub.add_parser("export", help="Write stored records back out as the parsers' JSON files")
+    exp.add_argument("--output-dir", help="Write to <dir>/<retailer>/ instead of output_<retailer>")
+    exp.add_argument("--date", action="append", help="Only this delivery date (repeatable)")
+    exp.add_argument("--retailer", action="append", choices=RETAILERS, help="Only this retailer (repeatable)")
+
+    imp = sub.add_parser("import-json", help="Load existing output JSON files into the store")
+    imp.add_argument("--retailer", action="append", choices=RETAILERS, help="Only this retailer (repeatable)")
+    args = parser.parse_args(argv)
+
+    path_config = load_path_config(args.paths)
+    if args.command == "export":
+        written = export_json(path_config, args.output_dir, args.date, args.retailer)
+        print(f"Exported {len(written)} records")
+    else:
+        count = import_json(path_config, args.retailer)
+        print(f"Imported {count} records into {store_path(path_config)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
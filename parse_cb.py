@@ -3,46 +3,30 @@
 import os
 import re
 import json
-import logging
 import pandas as pd
 from datetime import datetime
 
-def setup_logger(log_path):
-    os.makedirs(os.path.dirname(log_path), exist_ok=True)
-    logger = logging.getLogger("cb_parser")
-    logger.setLevel(logging.INFO)
-    fh = logging.FileHandler(log_path, encoding='utf-8')
-    fh.setLevel(logging.INFO)
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    fh.setFormatter(formatter)
-    if logger.hasHandlers():
-        logger.handlers.clear()
-    logger.addHandler(fh)
-    return logger
-
-def print_last_log_lines(log_path, n=10):
-    if not os.path.exists(log_path):
-        print("No log file found.")
-        return
-    with open(log_path, encoding='utf-8') as f:
-        lines = f.readlines()
-        print("".join(lines[-n:]))
-
-def write_json_output(data, output_dir, original_filename, logger):
-    os.makedirs(output_dir, exist_ok=True)
-    base_name = os.path.splitext(original_filename)[0]
-    json_filename = base_name + ".json"
-    output_path = os.path.join(output_dir, json_filename)
-    try:
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        logger.info(f"Output written: {output_path}")
-    except Exception as e:
-        logger.error(f"Failed to write JSON output: {e}")
+from log_utils import get_logger, print_last_log_lines
+from order_store import save_records
+from excel_reader import read_sheet, rows_to_frame, normalise_rows
+from instrument import span, file_span
+from config_registry import load_config
+
+# Bump whenever a change alters the normalised output
+PARSER_VERSION = "1"
+
+# Match d.m, dd.mm, d.m.yy, d.m.yyyy, dd.mm.yy, dd.mm.yyyy
+DATE_IN_FILENAME = re.compile(r'(\d{1,2})[.\-](\d{1,2})(?:[.\-](\d{2,4}))?')
+
+def save_output(records, path_config, filename, logger):
+    # Store errors propagate: returning [] here would read as an empty parse and drop the stored rows
+    outputs = save_records(path_config, "cb", records, source_file=filename)
+    for output in outputs:
+        logger.info(f"Output written: {output}")
+    return outputs
 
 def extract_delivery_date_from_filename(filename):
-    # Match d.m, dd.mm, d.m.yy, d.m.yyyy, dd.mm.yy, dd.mm.yyyy
-    match = re.search(r'(\d{1,2})[.\-](\d{1,2})(?:[.\-](\d{2,4}))?', filename)
+    match = DATE_IN_FILENAME.search(filename)
     if not match:
         return None
 
@@ -59,15 +43,14 @@ def extract_delivery_date_from_filename(filename):
         return None
 
 
-def parse_cb(file_path, path_config):
+@file_span("cb")
+def parse_cb(file_path, path_config, source=None):
     filename = os.path.basename(file_path)
 
-    with open("config/column_map_cb.json", encoding='utf-8') as f:
-        config = json.load(f)
+    config = load_config("cb")
 
     LOG_PATH = os.path.join(path_config["output_cb"], "parse_cb.log")
-    OUTPUT_DIR = path_config["output_cb"]
-    logger = setup_logger(LOG_PATH)
+    logger = get_logger("cb_parser", LOG_PATH)
     logger.info(f"Parsing file: {filename}")
 
     sheet_name = config["sheet_name"]
@@ -78,10 +61,14 @@ def parse_cb(file_path, path_config):
     default_tax = config["defaults"]["tax"]
 
     try:
-        df = pd.read_excel(file_path, sheet_name=sheet_name, header=header_row, engine='openpyxl')
+        with span("open") as s:
+            # An input already in memory (bytes or a file object) is read from there, not from file_path
+            sheet = read_sheet(file_path if source is None else source, sheet_name=sheet_name)
+            df = rows_to_frame(sheet.rows, header_row)
+            s.rows = len(df)
     except Exception as e:
         logger.error(f"Failed to load sheet '{sheet_name}' from {filename}: {e}")
-        return
+        raise
 
     df.dropna(how='all', inplace=True)
 
@@ -92,40 +79,19 @@ def parse_cb(file_path, path_config):
             break
     if not qty_col:
         logger.error(f"No valid quantity column found in {filename}")
-        return
+        return []
 
     delivery_date = extract_delivery_date_from_filename(filename)
     if not delivery_date:
         logger.warning(f"Delivery date set to null for {filename}")
 
-    rows = []
-    for idx, row in df.iterrows():
-        product_name = str(row.get(product_col_name)).strip()
-        if not product_name or product_name.lower() in ['nan', 'tổng cộng']:
-            continue
-
-        try:
-            qty = float(row[qty_col])
-        except (ValueError, TypeError):
-            continue
-
-        unit_price = None
-        if unit_price_col and unit_price_col in df.columns:
-            try:
-                unit_price = float(row[unit_price_col])
-            except (ValueError, TypeError):
-                unit_price = None
-
-        rows.append({
-            "product_name": product_name,
-            "qty": qty,
-            "unit_price": unit_price,
-            "tax": default_tax
-        })
+    with span("normalise") as s:
+        rows = normalise_rows(df, product_col_name, qty_col, unit_price_col, default_tax)
+        s.rows = len(rows)
 
     if not rows:
         logger.warning(f"No valid rows parsed in {filename}")
-        return
+        return []
 
     result = {
         "delivery_date": delivery_date,
@@ -133,8 +99,10 @@ def parse_cb(file_path, path_config):
         "rows": rows
     }
 
-    write_json_output(result, OUTPUT_DIR, filename, logger)
+    with span("write", rows=len(rows)):
+        outputs = save_output([(os.path.splitext(filename)[0], result)], path_config, filename, logger)
     print_last_log_lines(LOG_PATH, 10)
+    return outputs
 
 if __name__ == "__main__":
     with open("config/paths.json", encoding="utf-8") as f:
@@ -143,4 +111,7 @@ if __name__ == "__main__":
     input_dir = path_config["input_cb"]
     for fname in os.listdir(input_dir):
         if fname.lower().endswith((".xlsx", ".xls")):
-            parse_cb(os.path.join(input_dir, fname), path_config)
+            try:
+                parse_cb(os.path.join(input_dir, fname), path_config)
+            except Exception as e:
+                print(f"[ERROR] {fname}: {e}")
@@ -2,22 +2,51 @@ import os
 import re
 import json
 import logging
+import threading
+import multiprocessing
 from datetime import datetime
-import pytesseract
-from pytesseract import Output
-from PIL import Image
 import cv2
 import numpy as np
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from log_utils import setup_logger
+from ocr_cache import OcrCache
+from order_store import save_records
+from order_rows import OrderRow
+from instrument import span, file_span
+import config_registry
+from ocr_preprocess import PREPROCESS_PARAMS, Preprocessor, load_image
+from ocr_backend import TESSERACT_LANG, TESSERACT_CONFIG, get_backend
 
-with open("config/paths.json", "r", encoding="utf-8") as f:
-    PATHS = json.load(f)["paths"]
+# Bump whenever a change alters the normalised output
+PARSER_VERSION = "1"
 
-INPUT_DIR = PATHS["input_coop"]
-OUTPUT_DIR = PATHS["output_coop"]
+CONFIG_PATH = "config/column_map_coop.json"
+PATHS_PATH = "config/paths.json"
 
 DATE_PATTERN = re.compile(r"(\d{1,2})[.](\d{1,2})")
+# Expecting format: name ... 5-digit price ... qty
+PRICE_PATTERN = re.compile(r"\b(\d{2,3}[.,]\d{3})\b")
+QTY_PATTERN = re.compile(r"\b(\d{1,3})\b(?=\D*$)")  # last number likely to be qty
+
+# Tiled OCR cuts only through table rules or runs of at least MIN_GAP_ROWS blank pixel rows
+RULE_FRACTION = 0.9
+MIN_GAP_ROWS = 3
+TILE_PADDING = 8
+
+logger = logging.getLogger("coop_parser")
+
+_local = threading.local()
+
+def load_config(path=CONFIG_PATH):
+    if path == CONFIG_PATH:
+        # Cached, validated and read-only; re-read only when the file changes
+        return config_registry.load_config("coop")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def load_path_config(path=PATHS_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["paths"]
 
 def extract_date_from_filename(filename):
     match = DATE_PATTERN.search(filename)
@@ -29,84 +58,310 @@ def extract_date_from_filename(filename):
         return date_obj.strftime("%Y-%m-%d")
     except ValueError:
         return None
-def preprocess_image_for_ocr(image_path):
-    image = cv2.imread(image_path)
-
-    # Convert to HSV to mask red text
-    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-    lower_red1 = np.array([0, 50, 50])
-    upper_red1 = np.array([10, 255, 255])
-    lower_red2 = np.array([160, 50, 50])
-    upper_red2 = np.array([180, 255, 255])
-    red_mask = cv2.inRange(hsv, lower_red1, upper_red1) | cv2.inRange(hsv, lower_red2, upper_red2)
-
-    # Force red text to black (OCR-readable)
-    image[red_mask > 0] = [0, 0, 0]
-
-    # Sharpen and threshold
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    blur = cv2.GaussianBlur(gray, (3, 3), 0)
-    sharp = cv2.addWeighted(gray, 1.5, blur, -0.5, 0)
-    thresh = cv2.adaptiveThreshold(sharp, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                   cv2.THRESH_BINARY, 11, 2)
-    return thresh
-
-def parse_line_text(text):
+
+def preprocess_image_for_ocr(source, trim_margin=False):
+    """Thresholded image ready for tesseract; a view of this thread's Preprocessor buffers,
+    valid until the next call on the same thread."""
+    preprocessors = getattr(_local, "preprocessors", None)
+    if preprocessors is None:
+        preprocessors = _local.preprocessors = {}
+    if trim_margin not in preprocessors:
+        preprocessors[trim_margin] = Preprocessor(trim_margin=trim_margin)
+    return preprocessors[trim_margin].run(load_image(source))
+
+def ocr_settings(config):
+    """OCR mode from column_map_coop.json: "whole" (one tesseract call) or "tiled", and the backend.
+
+    ocr_workers 0 reads the strips on one thread per core in a standalone run
+    and on a single thread inside a run_all/watch pool worker, where every core
+    already parses another file.
+    """
+    workers = config.get("ocr_workers") or (
+        1 if multiprocessing.parent_process() is not None else os.cpu_count() or 1)
+    return {
+        "mode": config.get("ocr_mode", "whole"),
+        "tiles": config.get("ocr_tiles", 4),
+        "workers": workers,
+        "min_tile_height": config.get("ocr_min_tile_height", 200),
+        "trim_margin": bool(config.get("ocr_trim_margin", False)),
+        "backend": config.get("ocr_backend", "auto"),
+    }
+
+def ocr_cache_params(settings):
+    backend = get_backend(settings["backend"])
+    params = {
+        "preprocess": PREPROCESS_PARAMS,
+        "lang": TESSERACT_LANG,
+        "config": TESSERACT_CONFIG,
+        "tesseract": backend.version(),
+        "mode": settings["mode"],
+    }
+    if backend.name != "pytesseract":
+        # Entries written through the CLI keep their keys
+        params["backend"] = backend.name
+    if settings["trim_margin"]:
+        params["trim_margin"] = True
+    if settings["mode"] == "tiled":
+        # Where the image is cut depends on these; the thread count only changes how fast
+        params["tiles"] = settings["tiles"]
+        params["min_tile_height"] = settings["min_tile_height"]
+    return params
+
+def run_ocr(image, backend=None):
+    """Plain text and word boxes (image_to_data dict) from one recognition of the image."""
+    return (backend or get_backend()).recognize(image)
+
+def row_gaps(thresh):
+    """(start, end) pixel-row ranges that are safe to cut through, from the horizontal projection.
+
+    Co.op screenshots are grids: table rules (rows inked across nearly the
+    full width) separate the order lines, and any run of MIN_GAP_ROWS blank
+    rows is also between text lines. A shorter blank run can sit between a
+    Vietnamese diacritic and its letter, so it does not count.
+    """
+    ink = (thresh == 0).sum(axis=1)
+    rule = ink >= RULE_FRACTION * thresh.shape[1]
+    blank = ink == 0
+    gaps = []
+    for mask, min_rows in ((rule, 1), (blank, MIN_GAP_ROWS)):
+        edges = np.flatnonzero(np.diff(np.concatenate(([False], mask, [False])).astype(np.int8)))
+        gaps += [(int(a), int(b)) for a, b in zip(edges[::2], edges[1::2]) if b - a >= min_rows]
+    return sorted(gaps)
+
+def tile_bounds(thresh, n_tiles):
+    """Split the image into about n_tiles horizontal strips, cutting only through blank row bands."""
+    height = thresh.shape[0]
+    gaps = row_gaps(thresh)
+    if n_tiles <= 1 or not gaps:
+        return [(0, height)]
+
+    cuts = []
+    for i in range(1, n_tiles):
+        target = height * i // n_tiles
+        # Middle of the blank band closest to the even split
+        start, end = min(gaps, key=lambda g: abs((g[0] + g[1]) // 2 - target))
+        cut = (start + end) // 2
+        if 0 < cut < height and cut not in cuts:
+            cuts.append(cut)
+    cuts.sort()
+    edges = [0] + cuts + [height]
+    return list(zip(edges[:-1], edges[1:]))
+
+def merge_tile_results(results, bounds):
+    """Stitch per-tile OCR back into one result, shifting word boxes to page coordinates."""
+    texts = []
+    words = {}
+    block_offset = 0
+    for result, (top, _) in zip(results, bounds):
+        # Tesseract ends each page with a form feed; keep one at the very end only
+        texts.append(result["text"].rstrip("\f\n"))
+        tile_words = result["words"]
+        shift = top - TILE_PADDING
+        blocks = [int(b) for b in tile_words.get("block_num", [])]
+        for key, values in tile_words.items():
+            if key == "top":
+                values = [int(v) + shift for v in values]
+            elif key == "block_num":
+                values = [b + block_offset for b in blocks]
+            words.setdefault(key, []).extend(values)
+        block_offset += max(blocks, default=0)
+    return {"text": "\n".join(t for t in texts if t) + "\n\f", "words": words}
+
+def strip_bounds(image, tiles, min_tile_height=200):
+    """(top, bottom) of the strips tiled OCR reads; a single strip means the image is read whole."""
+    n_tiles = max(1, min(tiles, image.shape[0] // max(min_tile_height, 1)))
+    return tile_bounds(image, n_tiles)
+
+def run_ocr_tiled(image, tiles, workers=1, min_tile_height=200, backend=None):
+    """OCR row-band strips of the image concurrently and stitch the lines back in order.
+
+    Both backends recognise outside the GIL (a subprocess, or libtesseract),
+    so threads are enough to keep every core busy. Strips are cut only through
+    ink-free rows, so no text line is split and parse_line_text sees the same
+    lines as with a single call. The cuts depend on tiles and min_tile_height
+    only, never on workers, so the result is the same on any machine.
+    """
+    backend = backend or get_backend()
+    bounds = strip_bounds(image, tiles, min_tile_height)
+    if len(bounds) == 1:
+        return run_ocr(image, backend)
+
+    strips = [
+        cv2.copyMakeBorder(image[top:bottom], TILE_PADDING, TILE_PADDING, 0, 0,
+                           cv2.BORDER_CONSTANT, value=255)
+        for top, bottom in bounds
+    ]
+    results = backend.recognize_many(strips, workers)
+    logger.debug("Tiled OCR: %d strips at rows %s", len(strips), bounds)
+    return merge_tile_results(results, bounds)
+
+def read_source(source):
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if hasattr(source, "read"):
+        return source.read()
+    with open(source, "rb") as f:
+        return f.read()
+
+def ocr_image(source, cache=None, settings=None):
+    """Raw OCR result for an image, served from cache when the image and OCR settings are unchanged."""
+    settings = settings or ocr_settings({})
+    data = read_source(source)
+    key = None
+    if cache is not None:
+        key = cache.make_key(data, ocr_cache_params(settings))
+        result = cache.get(key)
+        if result is not None:
+            logger.debug("OCR cache hit: %s", key[:12])
+            return result
+
+    backend = get_backend(settings["backend"])
+    image = preprocess_image_for_ocr(data, settings["trim_margin"])
+    if settings["mode"] == "tiled":
+        result = run_ocr_tiled(image, settings["tiles"], settings["workers"], settings["min_tile_height"], backend)
+    else:
+        result = run_ocr(image, backend)
+    if cache is not None:
+        cache.put(key, result)
+    return result
+
+def ocr_images(sources, cache=None, settings=None):
+    """Raw OCR results for many images, in order; the cache misses are recognised as one batch.
+
+    The batch reads every image in one engine pass (one tesseract process
+    for the CLI backend), so the model is loaded once rather than per image.
+    In tiled mode, images tall enough to be cut are read strip-parallel on
+    their own; the rest join the batch.
+    """
+    settings = settings or ocr_settings({})
+    tiled = settings["mode"] == "tiled"
+    backend = get_backend(settings["backend"])
+    results = [None] * len(sources)
+    keys = [None] * len(sources)
+    pending, images = [], []
+    for i, source in enumerate(sources):
+        data = read_source(source)
+        if cache is not None:
+            keys[i] = cache.make_key(data, ocr_cache_params(settings))
+            results[i] = cache.get(keys[i])
+            if results[i] is not None:
+                continue
+        image = preprocess_image_for_ocr(data, settings["trim_margin"])
+        if tiled and len(strip_bounds(image, settings["tiles"], settings["min_tile_height"])) > 1:
+            results[i] = run_ocr_tiled(image, settings["tiles"], settings["workers"],
+                                       settings["min_tile_height"], backend)
+            if cache is not None:
+                cache.put(keys[i], results[i])
+            continue
+        # The preprocessed image is a view of a reused buffer; keep a copy per image
+        pending.append(i)
+        images.append(image.copy())
+
+    if images:
+        for i, result in zip(pending, backend.recognize_batch(images)):
+            results[i] = result
+            if cache is not None:
+                cache.put(keys[i], result)
+    logger.debug("OCR batch: %d images, %d in one batch", len(sources), len(pending))
+    return results
+
+def open_ocr_cache(path_config, config):
+    cache_dir = path_config.get("cache_ocr")
+    if not cache_dir:
+        return None
+    max_mb = config.get("ocr_cache", {}).get("max_mb", 200)
+    return OcrCache(cache_dir, max_bytes=int(max_mb * 1024 * 1024))
+
+def parse_line_text(text, tax=0):
     lines = [line.strip() for line in text.split("\n") if line.strip()]
     parsed_rows = []
     for line in lines:
-        # Expecting format: name ... 5-digit price ... qty
-        price_match = re.search(r"\b(\d{2,3}[.,]\d{3})\b", line)
-        qty_match = re.search(r"\b(\d{1,3})\b(?=\D*$)", line)  # last number likely to be qty
+        price_match = PRICE_PATTERN.search(line)
+        qty_match = QTY_PATTERN.search(line)
 
         if price_match and qty_match:
             price_str = price_match.group(1).replace(",", "").replace(".", "")
             qty = float(qty_match.group(1))
             product_name = line[:price_match.start()].strip()
-            parsed_rows.append({
-                "product_name": product_name,
-                "qty": qty,
-                "unit_price": float(price_str),
-                "tax": 0
-            })
+            parsed_rows.append(OrderRow(product_name, qty, float(price_str), tax))
     return parsed_rows
 
-def process_file(file_path):
-    filename = os.path.basename(file_path)
-    delivery_date = extract_date_from_filename(filename)
+def order_type_from_filename(filename, config):
+    keywords = config.get("order_type_keywords", {})
+    for label in ("forecast", "confirmed"):
+        keyword = keywords.get(label)
+        if keyword and filename.upper().startswith(keyword):
+            return label
+    return "unknown"
 
-    image = preprocess_image_for_ocr(file_path)
+def parse_coop_image(source, config, file_name=None, cache=None):
+    """OCR a Co.op screenshot (path or raw bytes) into a normalised dict, or None if no rows were read.
 
-    custom_oem_psm_config = r'--oem 3 --psm 6'
-    text = pytesseract.image_to_string(image, lang='eng', config=custom_oem_psm_config)
+    With an OcrCache, the OCR step is skipped for images already read with the
+    same preprocessing and tesseract settings.
+    """
+    filename = file_name or os.path.basename(source)
+    with span("ocr"):
+        text = ocr_image(source, cache, ocr_settings(config))["text"]
+    return build_record(text, filename, config)
 
-    parsed_rows = parse_line_text(text)
+def build_record(text, filename, config):
+    """Normalised dict from a screenshot's OCR text, or None if no rows were read."""
+    delivery_date = extract_date_from_filename(filename)
+    with span("normalise") as s:
+        parsed_rows = parse_line_text(text, config.get("tax", 0))
+        s.rows = len(parsed_rows)
 
     if not parsed_rows:
-        logging.warning(f"No valid rows parsed from image: {filename}")
-        return
-
-    if filename.upper().startswith("DU KIEN"):
-        label = "forecast"
-    elif filename.upper().startswith("CHOT"):
-        label = "confirmed"
-    else:
-        label = "unknown"
+        logger.warning("No valid rows parsed from image: %s", filename)
+        return None
 
-    output = {
+    return {
         "delivery_date": delivery_date,
         "source_file": filename,
-        "type": label,
+        "type": order_type_from_filename(filename, config),
         "rows": parsed_rows
     }
 
-    output_file = os.path.join(OUTPUT_DIR, f"{os.path.splitext(filename)[0]}.json")
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(output, f, ensure_ascii=False, indent=2)
+@file_span("coop")
+def process_file(file_path, path_config, config=None, cache=None, source=None):
+    filename = os.path.basename(file_path)
+    config = config or load_config()
+    if cache is None:
+        cache = open_ocr_cache(path_config, config)
+    output = parse_coop_image(file_path if source is None else source, config, filename, cache)
+    return save_output(file_path, output, path_config)
 
-    logging.info(f"Parsed and saved: {output_file}")
+def save_output(file_path, output, path_config):
+    filename = os.path.basename(file_path)
+    records = [(os.path.splitext(filename)[0], output)] if output is not None else []
+    with span("write", rows=len(output["rows"]) if output else 0):
+        outputs = save_records(path_config, "coop", records, source_file=filename)
+    for output_file in outputs:
+        logger.info("Parsed and saved: %s", output_file)
+    return outputs
+
+def process_files(file_paths, path_config, config=None, cache=None):
+    """Parse many screenshots with one batched OCR pass; returns the saved outputs per file."""
+    config = config or load_config()
+    if cache is None:
+        cache = open_ocr_cache(path_config, config)
+    results = ocr_images(file_paths, cache, ocr_settings(config))
+    outputs = {}
+    for file_path, result in zip(file_paths, results):
+        output = build_record(result["text"], os.path.basename(file_path), config)
+        outputs[file_path] = save_output(file_path, output, path_config)
+    return outputs
 
 if __name__ == "__main__":
-    for filename in os.listdir(INPUT_DIR):
-        if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
-            process_file(os.path.join(INPUT_DIR, filename))
+    setup_logger("coop_parser", console=True)
+    config = load_config()
+    paths = load_path_config()
+    input_dir = paths["input_coop"]
+    cache = open_ocr_cache(paths, config)
+
+    images = [
+        os.path.join(input_dir, filename) for filename in sorted(os.listdir(input_dir))
+        if filename.lower().endswith(('.jpg', '.jpeg', '.png'))
+    ]
+    process_files(images, paths, config, cache)
@@ -1,24 +1,47 @@
+import io
+import os
 import pdfplumber
+import pypdfium2 as pdfium
 import json
 import re
+import logging
 from pathlib import Path
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
-# Load column mapping
-with open("config/column_map_genshai.json", "r", encoding="utf-8") as f:
-    col_map = json.load(f)["genshai"]
+from log_utils import setup_logger, log_event
+from order_store import save_records
+from order_rows import OrderRow
+from instrument import span, file_span
+import config_registry
 
-# Load path config
-with open("config/paths.json", "r", encoding="utf-8") as f:
-    path_cfg = json.load(f)["paths"]
+# Bump whenever a change alters the normalised output
+PARSER_VERSION = "3"
 
-input_folder = Path(path_cfg["input_genshai"])
-output_folder = Path(path_cfg["output_genshai"])
-output_folder.mkdir(parents=True, exist_ok=True)
-log_path = output_folder / "parse_genshai.log"
+CONFIG_PATH = "config/column_map_genshai.json"
+PATHS_PATH = "config/paths.json"
+
+# PDFs with at least this many pages are split across worker processes by page range
+PARALLEL_MIN_PAGES = 8
+
+DELIVERY_DATE = re.compile(r"Ngày giao hàng:\s*(\d{1,2})/(\d{1,2})/(\d{4})")
+
+logger = logging.getLogger("genshai_parser")
+
+def load_config(path=CONFIG_PATH):
+    if path == CONFIG_PATH:
+        # Cached, validated and read-only; re-read only when the file changes
+        return config_registry.load_config("genshai")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["genshai"]
+
+def load_path_config(path=PATHS_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["paths"]
 
 # Utilities
 def extract_delivery_date(text):
-    match = re.search(r"Ngày giao hàng:\s*(\d{1,2})/(\d{1,2})/(\d{4})", text)
+    match = DELIVERY_DATE.search(text)
     if match:
         day, month, year = match.groups()
         return f"{year}-{int(month):02d}-{int(day):02d}"
@@ -39,52 +62,169 @@ def to_float(val):
 def safe_strip(val):
     return val.strip() if val else ""
 
+def open_pdf(source):
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    return pdfplumber.open(source)
+
+def iter_pages(source, start=0, stop=None, with_text=True):
+    """Yield (text, table) for each page in order.
+
+    Only the first page's text is extracted (it carries the delivery date),
+    and not even that when with_text is False. Both calls work off the same
+    Page, whose parsed layout pdfplumber keeps until page.close(), so each
+    page is laid out once.
+    """
+    with open_pdf(source) as pdf:
+        for index, page in enumerate(pdf.pages[start:stop], start=start):
+            text = page.extract_text() if with_text and index == 0 else None
+            yield text, page.extract_table()
+            page.close()
+
+def page_tables(source, start, stop, with_text=True):
+    # Worker entry point for one page range
+    return list(iter_pages(source, start, stop, with_text))
+
+def page_ranges(n_pages, workers):
+    step = -(-n_pages // workers)
+    return [(start, min(start + step, n_pages)) for start in range(0, n_pages, step)]
+
+def iter_pdf_pages(source, workers=None, with_text=True):
+    """(text, table) per page in order; large PDFs are read by a process pool, one page range per worker.
+
+    Without an explicit workers count the pool is skipped inside another pool's worker process.
+    """
+    if hasattr(source, "read"):
+        source = source.read()
+    with open_pdf(source) as pdf:
+        n_pages = len(pdf.pages)
+
+    if workers is None:
+        workers = 1 if multiprocessing.parent_process() is not None else os.cpu_count() or 1
+    if n_pages < PARALLEL_MIN_PAGES or workers < 2:
+        yield from iter_pages(source, with_text=with_text)
+        return
+
+    if isinstance(source, Path):
+        source = str(source)
+    ranges = page_ranges(n_pages, min(workers, n_pages))
+    with ProcessPoolExecutor(max_workers=len(ranges)) as pool:
+        futures = [pool.submit(page_tables, source, start, stop, with_text) for start, stop in ranges]
+        for future in futures:
+            yield from future.result()
+
+def fast_first_page_text(source):
+    """First page text from pdfium's text layer, without pdfplumber's layout analysis."""
+    if isinstance(source, Path):
+        source = str(source)
+    pdf = pdfium.PdfDocument(source)
+    try:
+        page = pdf[0]
+        textpage = page.get_textpage()
+        text = textpage.get_text_bounded().replace("\r\n", "\n")
+        textpage.close()
+        page.close()
+        return text
+    finally:
+        pdf.close()
+
+def parse_table_rows(table, col_map):
+    rows = []
+    for row in table:
+        if not row or len(row) <= max(col_map.values()):
+            continue
+        if not safe_strip(row[col_map["product_name"]]):
+            continue
+        rows.append(OrderRow(
+            safe_strip(row[col_map["product_name"]]),
+            to_int(row[col_map["qty"]]),
+            to_float(row[col_map["unit_price"]]),
+            to_float(row[col_map["tax"]]),
+        ))
+    return rows
+
 # Parser
-def parse_genshai_pdf(pdf_path: Path) -> dict:
-    with pdfplumber.open(pdf_path) as pdf:
-        page = pdf.pages[0]
-        text = page.extract_text()
-        delivery_date = extract_delivery_date(text)
-        table = page.extract_table()
-        rows = []
-
-        if table:
-            for row in table[1:]:
-                if not row or len(row) <= max(col_map.values()):
-                    continue
-                if not safe_strip(row[col_map["product_name"]]):
-                    continue
-                rows.append({
-                    "product_name": safe_strip(row[col_map["product_name"]]),
-                    "qty": to_int(row[col_map["qty"]]),
-                    "unit_price": to_float(row[col_map["unit_price"]]),
-                    "tax": to_float(row[col_map["tax"]])
-                })
+def parse_genshai_pdf(source, col_map, file_name=None, workers=None, tiered=True) -> dict:
+    """Parse a Genshai delivery note (path, file object or raw bytes) into a normalised dict.
+
+    Rows are read from every page. The first row of the first table found (on
+    whichever page that is) is the header; later pages drop their first row
+    only when it repeats that header.
+
+    The table needs pdfplumber, but with tiered=True the delivery date is first
+    looked for in pdfium's raw text and pdfplumber's text extraction is only
+    run when that finds none. The tier is logged as a pdf_text_tier event.
+    """
+    file_name = file_name or Path(source).name
+    if hasattr(source, "read"):
+        source = source.read()
+
+    delivery_date = None
+    reason = "disabled"
+    if tiered:
+        try:
+            with span("extract", tier="fast"):
+                delivery_date = extract_delivery_date(fast_first_page_text(source))
+            reason = None if delivery_date else "no_date"
+        except pdfium.PdfiumError as e:
+            reason = f"pdfium: {e}"
+    tier = "fast" if reason is None else "layout"
+
+    header = None
+    rows = []
+    with span("layout", reason=reason) as s:
+        for index, (text, table) in enumerate(iter_pdf_pages(source, workers, with_text=tier == "layout")):
+            if index == 0 and tier == "layout":
+                delivery_date = extract_delivery_date(text or "")
+            if not table:
+                continue
+            if header is None:
+                header = table[0]
+                table = table[1:]
+            elif table[0] == header:
+                table = table[1:]
+            rows.extend(parse_table_rows(table, col_map))
+        s.rows = len(rows)
+    log_event(logger, logging.INFO, "pdf_text_tier", file=file_name, tier=tier,
+              reason=reason, rows=len(rows))
 
     return {
         "delivery_date": delivery_date,
-        "source_file": pdf_path.name,
+        "source_file": file_name,
         "rows": rows
     }
 
+@file_span("genshai")
+def process_file(pdf_path, path_config, col_map=None, logs=None, source=None):
+    pdf_file = Path(pdf_path)
+    parsed_data = parse_genshai_pdf(pdf_file if source is None else source, col_map or load_config(), pdf_file.name)
+    with span("write", rows=len(parsed_data["rows"])):
+        outputs = save_records(path_config, "genshai", [(pdf_file.stem, parsed_data)], source_file=pdf_file.name)
+    if logs is not None:
+        logs.append(f"[OK] {pdf_file.name} → {len(parsed_data['rows'])} rows")
+    return outputs
+
 # Runner
-logs = []
+if __name__ == "__main__":
+    col_map = load_config()
+    path_cfg = load_path_config()
+    input_folder = Path(path_cfg["input_genshai"])
+    log_path = Path(path_cfg["output_genshai"]) / "parse_genshai.log"
+    setup_logger("genshai_parser", str(Path(path_cfg["output_genshai"]) / "parse_genshai_events.log"))
+    logs = []
 
-for pdf_file in input_folder.glob("*.pdf"):
-    try:
-        parsed_data = parse_genshai_pdf(pdf_file)
-        output_path = output_folder / pdf_file.with_suffix(".json").name
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(parsed_data, f, ensure_ascii=False, indent=2)
-        logs.append(f"[OK] {pdf_file.name} → {len(parsed_data['rows'])} rows")
-    except Exception as e:
-        logs.append(f"[ERROR] {pdf_file.name}: {e}")
+    for pdf_file in input_folder.glob("*.pdf"):
+        try:
+            process_file(pdf_file, path_cfg, col_map, logs)
+        except Exception as e:
+            logs.append(f"[ERROR] {pdf_file.name}: {e}")
 
-# Log file output
-with open(log_path, "w", encoding="utf-8") as f:
-    for line in logs:
-        f.write(line + "\n")
+    # Log file output
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(log_path, "w", encoding="utf-8") as f:
+        for line in logs:
+            f.write(line + "\n")
 
-# Console preview
-for line in logs[-10:]:
-    print(line)
+    # Console preview
+    for line in logs[-10:]:
+        print(line)
@@ -1,58 +1,91 @@
-from openpyxl import Workbook, load_workbook
 import xlrd
 import json
+import logging
 from pathlib import Path
 from datetime import datetime
 
-# Load config
-with open("config/column_map_lotte.json", "r", encoding="utf-8") as f:
-    config = json.load(f)["lotte_excel"]
-
-with open("config/paths.json", "r", encoding="utf-8") as f:
-    paths = json.load(f)["paths"]
-
-input_dir = Path(paths["input_lotte"])
-output_dir = Path(paths["output_lotte"])
-output_dir.mkdir(parents=True, exist_ok=True)
-log_path = output_dir / "parse_lotte.log"
-
-field_map = config["field_map"]
-date_fmt = config["date_format"]
-
-logs = []
-
-def convert_xls_to_workbook(xls_path):
-    print(f"[DEBUG] Converting XLS: {xls_path.name}")
-    book = xlrd.open_workbook(xls_path)
-    sheet = book.sheet_by_index(0)
-    wb = Workbook()
-    ws = wb.active
-    for row_idx in range(sheet.nrows):
-        ws.append(sheet.row_values(row_idx))
-    return wb
-
-def parse_lotte_workbook(wb, file_name):
-    print(f"[DEBUG] Parsing workbook: {file_name}")
-    ws = wb.active
-    order_blocks = []
+from excel_reader import iter_rows
+from log_utils import setup_logger, log_event
+from order_store import save_records
+from order_rows import OrderRow
+from instrument import span, file_span
+import config_registry
+
+# Bump whenever a change alters the normalised output
+PARSER_VERSION = "1"
+
+CONFIG_PATH = "config/column_map_lotte.json"
+PATHS_PATH = "config/paths.json"
+
+# Columns read per row: E (slip), M (delivery date), U (product), AA-AC (price, tax, qty)
+ROW_WIDTH = 29
+FIRST_ROW = 5
+
+logger = logging.getLogger("lotte_parser")
+
+def load_config(path=CONFIG_PATH):
+    if path == CONFIG_PATH:
+        # Cached, validated and read-only; re-read only when the file changes
+        return config_registry.load_config("lotte")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["lotte_excel"]
+
+def load_path_config(path=PATHS_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["paths"]
+
+def iter_xls_rows(source, min_row=1):
+    if isinstance(source, (bytes, bytearray)):
+        book = xlrd.open_workbook(file_contents=bytes(source), on_demand=True)
+    else:
+        book = xlrd.open_workbook(source, on_demand=True)
+    try:
+        sheet = book.sheet_by_index(0)
+        for row_idx in range(min_row - 1, sheet.nrows):
+            yield tuple(sheet.row_values(row_idx))
+    finally:
+        book.release_resources()
+
+def iter_lotte_rows(source, file_name, min_row=FIRST_ROW):
+    """Row tuples straight from xlrd (.xls) or read-only openpyxl (.xlsx); None if unsupported."""
+    suffix = Path(file_name).suffix
+    if suffix == ".xls":
+        return iter_xls_rows(source, min_row)
+    if suffix == ".xlsx":
+        return iter_rows(source, min_row=min_row)
+    return None
+
+def iter_order_blocks(rows, file_name, config, start_row=FIRST_ROW):
+    """Yield one normalised dict per order slip as soon as the slip's last row has been read.
+
+    Only the current slip's rows are held, so memory does not grow with the export.
+    """
+    logger.debug("Parsing workbook: %s", file_name)
+    # Checked once: per-row debug calls are skipped entirely unless enabled
+    debug = logger.isEnabledFor(logging.DEBUG)
+    date_fmt = config["date_format"]
     current_slip = None
     current_date = None
     current_rows = []
 
-    for row_idx, row in enumerate(ws.iter_rows(min_row=5, values_only=True), start=5):
-        print(f"[DEBUG] Row {row_idx}: {row}")
+    for row_idx, row in enumerate(rows, start=start_row):
+        if len(row) < ROW_WIDTH:
+            row = tuple(row) + (None,) * (ROW_WIDTH - len(row))
+        if debug:
+            logger.debug("Row %d: %s", row_idx, row)
         slip_val = row[4]      # column E
         product_val = row[20]  # column U
 
         if slip_val and isinstance(slip_val, str) and "-" in slip_val:
             if current_slip and current_rows:
-                order_blocks.append({
+                if debug:
+                    logger.debug("Block saved: %s with %d rows", current_slip, len(current_rows))
+                yield {
                     "delivery_date": current_date,
                     "source_file": file_name,
                     "order_slip": current_slip,
                     "rows": current_rows
-                })
-                print(f"[DEBUG] Block saved: {current_slip} with {len(current_rows)} rows")
+                }
 
             current_slip = slip_val.strip()
             current_rows = []
@@ -64,13 +97,16 @@ def parse_lotte_workbook(wb, file_name):
                     raw_date_str = str(raw_date).strip()
                     dt = datetime.strptime(raw_date_str, date_fmt)
                     current_date = dt.strftime("%Y-%m-%d")
-                    print(f"[DEBUG] Date detected: {current_date}")
-                else:
-                    print(f"[DEBUG] No delivery date in row {row_idx}")
+                    if debug:
+                        logger.debug("Date detected: %s", current_date)
+                elif debug:
+                    logger.debug("No delivery date in row %d", row_idx)
             except Exception as e:
-                print(f"[WARN] Failed to parse delivery date in slip header (row {row_idx}): {raw_date} — {e}")
+                log_event(logger, logging.WARNING, "Failed to parse delivery date in slip header",
+                          file=file_name, row=row_idx, raw_date=raw_date, error=str(e))
 
-            print(f"[DEBUG] New slip: {current_slip}")
+            if debug:
+                logger.debug("New slip: %s", current_slip)
 
         if not product_val or not current_slip:
             continue
@@ -81,54 +117,92 @@ def parse_lotte_workbook(wb, file_name):
             tax = float(str(row[27]).replace(",", ""))          # column AB
             qty = int(str(row[28]).replace(",", ""))            # column AC
 
-            current_rows.append({
-                "product_name": product_name,
-                "qty": qty,
-                "unit_price": unit_price,
-                "tax": tax
-            })
-            print(f"[DEBUG] Row added: {product_name}, {qty}, {unit_price}, {tax}")
+            current_rows.append(OrderRow(product_name, qty, unit_price, tax))
+            if debug:
+                logger.debug("Row added: %s, %s, %s, %s", product_name, qty, unit_price, tax)
 
         except Exception as e:
-            print(f"[ERROR] Row parse failed: {e}")
+            log_event(logger, logging.ERROR, "Row parse failed", file=file_name, row=row_idx, error=str(e))
             continue
 
     if current_slip and current_rows:
-        order_blocks.append({
+        if debug:
+            logger.debug("Final block saved: %s with %d rows", current_slip, len(current_rows))
+        yield {
             "delivery_date": current_date,
             "source_file": file_name,
             "order_slip": current_slip,
             "rows": current_rows
-        })
-        print(f"[DEBUG] Final block saved: {current_slip} with {len(current_rows)} rows")
-
-    for block in order_blocks:
-        out_file = output_dir / f"{file_name}__{block['order_slip']}.json"
-        with open(out_file, "w", encoding="utf-8") as f:
-            json.dump(block, f, ensure_ascii=False, indent=2)
-        logs.append(f"[OK] {out_file.name} → {len(block['rows'])} rows")
+        }
+
+def parse_lotte_rows(rows, file_name, config, start_row=FIRST_ROW):
+    return list(iter_order_blocks(rows, file_name, config, start_row))
+
+def iter_lotte_blocks(source, config, file_name=None):
+    """Order slips of a Lotte export (path, file object or raw bytes), one at a time."""
+    file_name = file_name or Path(source).name
+    if hasattr(source, "read"):
+        source = source.read()
+    rows = iter_lotte_rows(source, file_name)
+    if rows is None:
+        logger.info("Skipping unsupported file: %s", file_name)
+        return iter(())
+    return iter_order_blocks(rows, file_name, config)
+
+def parse_lotte(source, config, file_name=None):
+    """Parse a Lotte export (path, file object or raw bytes) into one normalised dict per order slip."""
+    return list(iter_lotte_blocks(source, config, file_name))
+
+def write_blocks(order_blocks, path_config, file_name, logs=None):
+    """Save every order slip of one export in a single store transaction (plus JSON when enabled).
+
+    order_blocks may be a generator: each slip is written and released before the next is parsed.
+    """
+    def records():
+        for block in order_blocks:
+            record_key = f"{file_name}__{block['order_slip']}"
+            if logs is not None:
+                logs.append(f"[OK] {record_key}.json → {len(block['rows'])} rows")
+            yield record_key, block
+    return save_records(path_config, "lotte", records(), source_file=file_name)
+
+def counted(blocks, counter):
+    for block in blocks:
+        counter[0] += len(block["rows"])
+        yield block
+
+@file_span("lotte")
+def process_file(file_path, path_config, config=None, logs=None, source=None):
+    file = Path(file_path)
+    logger.debug("Processing file: %s", file.name)
+    row_count = [0]
+    # Slips are parsed and saved in one pass, so a single span covers extraction and writing
+    with span("extract") as s:
+        blocks = iter_lotte_blocks(file if source is None else source, config or load_config(), file.name)
+        outputs = write_blocks(counted(blocks, row_count), path_config, file.name, logs)
+        s.rows = row_count[0]
+    return outputs
 
 # Main execution
-for file in input_dir.glob("*"):
-    print(f"[DEBUG] Processing file: {file.name}")
-    try:
-        if file.suffix == ".xls":
-            wb = convert_xls_to_workbook(file)
-        elif file.suffix == ".xlsx":
-            wb = load_workbook(file, data_only=True)
-        else:
-            print(f"[SKIP] Unsupported file: {file.name}")
-            continue
-
-        parse_lotte_workbook(wb, file.name)
-
-    except Exception as e:
-        logs.append(f"[ERROR] {file.name}: {e}")
-        print(f"[ERROR] Exception while processing {file.name}: {e}")
+if __name__ == "__main__":
+    setup_logger("lotte_parser", console=True)
+    config = load_config()
+    paths = load_path_config()
+    input_dir = Path(paths["input_lotte"])
+    log_path = Path(paths["output_lotte"]) / "parse_lotte.log"
+    logs = []
+
+    for file in input_dir.glob("*"):
+        try:
+            process_file(file, paths, config, logs)
+        except Exception as e:
+            logs.append(f"[ERROR] {file.name}: {e}")
+            logger.error("Exception while processing %s: %s", file.name, e)
 
-with open(log_path, "w", encoding="utf-8") as f:
-    for line in logs:
-        f.write(line + "\n")
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(log_path, "w", encoding="utf-8") as f:
+        for line in logs:
+            f.write(line + "\n")
 
-for line in logs[-10:]:
-    print(line)
+    for line in logs[-10:]:
+        print(line)
@@ -1,23 +1,51 @@
+import io
+import os
 import re
 import json
+import logging
 from pathlib import Path
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import pdfplumber
+import pypdfium2 as pdfium
 
-# Load configs
-with open("config/column_map_mini.json", "r", encoding="utf-8") as f:
-    config = json.load(f)["mini_order"]
+from log_utils import setup_logger, log_event
+from order_store import save_records
+from order_rows import OrderRow
+from instrument import span, file_span
+import config_registry
 
-with open("config/paths.json", "r", encoding="utf-8") as f:
-    path_cfg = json.load(f)["paths"]
+# Bump whenever a change alters the normalised output
+PARSER_VERSION = "2"
 
-input_folder = Path(path_cfg["input_mini"])
-output_folder = Path(path_cfg["output_mini"])
-output_folder.mkdir(parents=True, exist_ok=True)
-log_path = output_folder / "parse_mini.log"
+CONFIG_PATH = "config/column_map_mini.json"
+PATHS_PATH = "config/paths.json"
+
+ROW_PATTERN = re.compile(r"^(\d{7})\s+(.+?)\s+EA\s+([\d,]+)\s+(\d+)\s+([\d,]+)")
+# Any line that starts like an order row, matched or not; used to validate fast text
+SKU_LINE = re.compile(r"^\s*\d{7}\s")
+GRAND_TOTAL = re.compile(r"^Grand Total\s+([\d,]+)")
+DATE_PATTERN = re.compile(r"(\d{1,2})-(\d{1,2})-(\d{4})")
+
+# PDFs with at least this many pages are split across worker processes by page range
+PARALLEL_MIN_PAGES = 8
+
+logger = logging.getLogger("mini_parser")
+
+def load_config(path=CONFIG_PATH):
+    if path == CONFIG_PATH:
+        # Cached, validated and read-only; re-read only when the file changes
+        return config_registry.load_config("mini")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["mini_order"]
+
+def load_path_config(path=PATHS_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["paths"]
 
 # Utility functions
 def extract_date_from_text(text):
-    match = re.search(r"(\d{1,2})-(\d{1,2})-(\d{4})", text)
+    match = DATE_PATTERN.search(text)
     if match:
         day, month, year = match.groups()
         return f"{year}-{int(month):02d}-{int(day):02d}"
@@ -44,54 +72,186 @@ def to_float(s):
 def safe_strip(val):
     return val.strip() if val else ""
 
-# Parser using structured text
-def parse_mini_text_pdf(pdf_path: Path) -> dict:
-    with pdfplumber.open(pdf_path) as pdf:
-        page = pdf.pages[0]
-        text = page.extract_text()
+def open_pdf(source):
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    return pdfplumber.open(source)
 
-    delivery_date = extract_date_from_text(text)
-    store = extract_store_name(text)
-    rows = []
+def iter_page_text(source, start=0, stop=None):
+    """Yield the text of each page in order, dropping each page's layout once it has been read."""
+    with open_pdf(source) as pdf:
+        for page in pdf.pages[start:stop]:
+            yield page.extract_text() or ""
+            page.close()
+
+def page_texts(source, start, stop):
+    # Worker entry point for one page range
+    return list(iter_page_text(source, start, stop))
+
+def page_ranges(n_pages, workers):
+    step = -(-n_pages // workers)
+    return [(start, min(start + step, n_pages)) for start in range(0, n_pages, step)]
+
+def iter_pdf_text(source, workers=None):
+    """Page texts in order; large PDFs are read by a process pool, one page range per worker.
+
+    The pool is only used when this is the main process: inside a run_all (or
+    watch/async pipeline) worker every core is already busy with another file.
+    """
+    if hasattr(source, "read"):
+        source = source.read()
+    with open_pdf(source) as pdf:
+        n_pages = len(pdf.pages)
+
+    if workers is None:
+        workers = 1 if multiprocessing.parent_process() is not None else os.cpu_count() or 1
+    if n_pages < PARALLEL_MIN_PAGES or workers < 2:
+        yield from iter_page_text(source)
+        return
+
+    if isinstance(source, Path):
+        source = str(source)
+    ranges = page_ranges(n_pages, min(workers, n_pages))
+    with ProcessPoolExecutor(max_workers=len(ranges)) as pool:
+        futures = [pool.submit(page_texts, source, start, stop) for start, stop in ranges]
+        for future in futures:
+            yield from future.result()
+
+def fast_text(source):
+    """Raw text of every page straight from pdfium's text layer, with no layout analysis."""
+    if isinstance(source, Path):
+        source = str(source)
+    pdf = pdfium.PdfDocument(source)
+    try:
+        pages = []
+        for page in pdf:
+            textpage = page.get_textpage()
+            pages.append(textpage.get_text_bounded().replace("\r\n", "\n"))
+            textpage.close()
+            page.close()
+        return pages
+    finally:
+        pdf.close()
+
+def check_fast_text(text, rows):
+    """Why fast-path text can't be trusted, or None when it matches the expected layout.
 
+    Every line that starts with a SKU must have parsed into a row, the
+    quantities must add up to the Grand Total line when there is one, and the
+    delivery date must be present.
+    """
+    if not rows:
+        return "no_rows"
+    sku_lines = sum(1 for line in text.splitlines() if SKU_LINE.match(line))
+    if sku_lines != len(rows):
+        return "row_count"
     for line in text.splitlines():
-        match = re.match(r"^(\d{7})\s+(.+?)\s+EA\s+([\d,]+)\s+(\d+)\s+([\d,]+)", line)
+        total = GRAND_TOTAL.match(line.strip())
+        if total and to_int(total.group(1)) != sum(row["qty"] for row in rows):
+            return "grand_total"
+    if extract_date_from_text(text) is None:
+        return "no_date"
+    return None
+
+def parse_rows(text, tax):
+    rows = []
+    for line in text.splitlines():
+        match = ROW_PATTERN.match(line)
         if match:
             sku, name, unit_price, qty, _ = match.groups()
-            rows.append({
-                "product_name": name,
-                "qty": to_int(qty),
-                "unit_price": to_float(unit_price),
-                "tax": config["tax"]
-            })
+            rows.append(OrderRow(name, to_int(qty), to_float(unit_price), tax))
+    return rows
+
+def parse_pages(texts, tax):
+    delivery_date = None
+    store = "Unknown"
+    rows = []
+    for text in texts:
+        if delivery_date is None:
+            delivery_date = extract_date_from_text(text)
+        if store == "Unknown":
+            store = extract_store_name(text)
+        rows.extend(parse_rows(text, tax))
+    return delivery_date, store, rows
+
+# Parser using structured text
+def parse_mini_text_pdf(source, config, file_name=None, workers=None, tiered=True) -> dict:
+    """Parse a Mini delivery note (path, file object or raw bytes) into a normalised dict.
+
+    Rows are read from every page; the repeated column headers on later pages
+    never match the SKU row pattern, so they drop out on their own. Date and
+    store come from the first page that has them.
+
+    With tiered=True the raw pdfium text is tried first and kept if it passes
+    check_fast_text; otherwise pdfplumber's layout text is used. The tier is
+    logged as a pdf_text_tier event.
+    """
+    file_name = file_name or Path(source).name
+    if hasattr(source, "read"):
+        source = source.read()
+    tax = config["tax"]
+
+    reason = "disabled"
+    if tiered:
+        try:
+            with span("extract", tier="fast"):
+                texts = fast_text(source)
+            with span("normalise") as s:
+                delivery_date, store, rows = parse_pages(texts, tax)
+                s.rows = len(rows)
+            reason = check_fast_text("\n".join(texts), rows)
+        except pdfium.PdfiumError as e:
+            reason = f"pdfium: {e}"
+    if reason is None:
+        tier = "fast"
+    else:
+        tier = "layout"
+        with span("layout", reason=reason) as s:
+            delivery_date, store, rows = parse_pages(iter_pdf_text(source, workers), tax)
+            s.rows = len(rows)
+    log_event(logger, logging.INFO, "pdf_text_tier", file=file_name, tier=tier,
+              reason=reason, rows=len(rows))
 
     return {
         "delivery_date": delivery_date,
         "store": store,
-        "source_file": pdf_path.name,
+        "source_file": file_name,
         "rows": rows
     }
 
+@file_span("mini")
+def process_file(pdf_path, path_config, config=None, logs=None, source=None):
+    pdf_file = Path(pdf_path)
+    parsed = parse_mini_text_pdf(pdf_file if source is None else source, config or load_config(), pdf_file.name)
+    with span("write", rows=len(parsed["rows"])):
+        outputs = save_records(path_config, "mini", [(pdf_file.stem, parsed)], source_file=pdf_file.name)
+    if logs is not None:
+        logs.append(f"[OK] {pdf_file.name} → {len(parsed['rows'])} rows")
+    return outputs
+
 # Execution
-logs = []
+if __name__ == "__main__":
+    config = load_config()
+    path_cfg = load_path_config()
+    input_folder = Path(path_cfg["input_mini"])
+    log_path = Path(path_cfg["output_mini"]) / "parse_mini.log"
+    setup_logger("mini_parser", str(Path(path_cfg["output_mini"]) / "parse_mini_events.log"))
+    logs = []
 
-for pdf_file in input_folder.glob("*.pdf"):
-    if "DONG XANH FOOD" not in pdf_file.name.upper():
-        continue
+    for pdf_file in input_folder.glob("*.pdf"):
+        if "DONG XANH FOOD" not in pdf_file.name.upper():
+            continue
 
-    try:
-        parsed = parse_mini_text_pdf(pdf_file)
-        out_file = output_folder / pdf_file.with_suffix(".json").name
-        with open(out_file, "w", encoding="utf-8") as f:
-            json.dump(parsed, f, ensure_ascii=False, indent=2)
-        logs.append(f"[OK] {pdf_file.name} → {len(parsed['rows'])} rows")
-    except Exception as e:
-        logs.append(f"[ERROR] {pdf_file.name}: {e}")
+        try:
+            process_file(pdf_file, path_cfg, config, logs)
+        except Exception as e:
+            logs.append(f"[ERROR] {pdf_file.name}: {e}")
 
-# Write log
-with open(log_path, "w", encoding="utf-8") as f:
-    for line in logs:
-        f.write(line + "\n")
+    # Write log
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(log_path, "w", encoding="utf-8") as f:
+        for line in logs:
+            f.write(line + "\n")
 
-for line in logs[-10:]:
-    print(line)
+    for line in logs[-10:]:
+        print(line)
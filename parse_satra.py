@@ -2,43 +2,27 @@
 
 import os
 import json
-import logging
-import openpyxl
 import re
 
 from datetime import datetime
 
-def setup_logger(log_path):
-    os.makedirs(os.path.dirname(log_path), exist_ok=True)
-    logger = logging.getLogger("satra_parser")
-    logger.setLevel(logging.INFO)
-    fh = logging.FileHandler(log_path, encoding='utf-8')
-    fh.setLevel(logging.INFO)
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    fh.setFormatter(formatter)
-    if logger.hasHandlers():
-        logger.handlers.clear()
-    logger.addHandler(fh)
-    return logger
-
-def print_last_log_lines(log_path, n=10):
-    if not os.path.exists(log_path):
-        print("No log file found.")
-        return
-    with open(log_path, encoding='utf-8') as f:
-        lines = f.readlines()
-        print("".join(lines[-n:]))
-
-def write_json_output(data, output_dir, base_name, suffix, logger):
-    os.makedirs(output_dir, exist_ok=True)
-    json_filename = f"{base_name}_{suffix}.json"
-    output_path = os.path.join(output_dir, json_filename)
-    try:
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        logger.info(f"Output written: {output_path}")
-    except Exception as e:
-        logger.error(f"Failed to write JSON output: {e}")
+from log_utils import get_logger, print_last_log_lines
+from order_store import save_records
+from excel_reader import read_sheet, cell
+from instrument import span, file_span
+from config_registry import load_rules
+from order_rows import OrderRow
+
+# Bump whenever a change alters the normalised output
+PARSER_VERSION = "1"
+
+DATE_SEPARATORS = re.compile(r"[.\-/]")
+
+def save_output(records, path_config, filename, logger):
+    outputs = save_records(path_config, "satra", records, source_file=filename)
+    for output in outputs:
+        logger.info(f"Output written: {output}")
+    return outputs
 
 def parse_delivery_date(raw_value):
     if not raw_value:
@@ -46,7 +30,7 @@ def parse_delivery_date(raw_value):
 
     try:
         # Accept "dd.mm", "dd.mm.yy", "dd.mm.yyyy", "dd/mm", etc.
-        parts = [int(p) for p in re.split(r"[.\-/]", str(raw_value).strip())]
+        parts = [int(p) for p in DATE_SEPARATORS.split(str(raw_value).strip())]
         if len(parts) == 2:
             d, m = parts
             y = datetime.now().year
@@ -59,67 +43,33 @@ def parse_delivery_date(raw_value):
     except Exception:
         return None
 
-def parse_satra(file_path, path_config):
-    import re
-
-    filename = os.path.basename(file_path)
+def warehouse_records(table, rules, delivery_date, filename):
+    """One (record_key, record) per warehouse column that has order lines; table starts at rules.first_row."""
     base_name = os.path.splitext(filename)[0]
-
-    with open("config/column_map_satra.json", encoding='utf-8') as f:
-        config = json.load(f)
-
-    LOG_PATH = os.path.join(path_config["output_satra"], "parse_satra.log")
-    OUTPUT_DIR = path_config["output_satra"]
-    logger = setup_logger(LOG_PATH)
-    logger.info(f"Parsing file: {filename}")
-
-    try:
-        wb = openpyxl.load_workbook(file_path, data_only=True)
-        sheet = wb.active
-    except Exception as e:
-        logger.error(f"Failed to open workbook: {e}")
-        return
-
-    delivery_date_raw = sheet[config["delivery_date_cell"]].value
-    delivery_date = parse_delivery_date(delivery_date_raw)
-    print(f"Raw delivery date value: {repr(delivery_date_raw)}")
-
-
-    product_col = config["product_name_column"]
-    start_row = config["product_name_header_row"] + 1
-    tax = config["tax"]
-
-    for warehouse, meta in config["warehouse_columns"].items():
-        qty_col = meta["qty_col"]
-        qty_start_row = meta["header_row"] + 1
+    product_idx = rules.product_idx
+    records = []
+    for warehouse, qty_idx, qty_start_row in rules.warehouses:
         rows = []
 
-        row_idx = max(start_row, qty_start_row)
-        while True:
-            product_cell = sheet[f"{product_col}{row_idx}"]
-            qty_cell = sheet[f"{qty_col}{row_idx}"]
+        for i in range(max(rules.start_row, qty_start_row) - rules.first_row, len(table)):
+            row = table[i]
+            product_value = cell(row, product_idx)
+            qty_value = cell(row, qty_idx)
 
-            product_name = str(product_cell.value).strip() if product_cell.value else ""
+            product_name = str(product_value).strip() if product_value else ""
             if not product_name or product_name.lower() in ["tổng cộng", ""]:
-                row_idx += 1
                 continue
 
             try:
-                qty = float(qty_cell.value)
+                qty = float(qty_value)
             except (ValueError, TypeError):
-                row_idx += 1
                 continue
 
-            rows.append({
-                "product_name": product_name,
-                "qty": qty,
-                "unit_price": None,
-                "tax": tax
-            })
-            row_idx += 1
+            rows.append(OrderRow(product_name, qty, None, rules.tax))
 
-            # Stop if all key cells in row are empty
-            if all(sheet[f"{c}{row_idx}"].value in [None, "", " "] for c in [product_col, qty_col]):
+            # Stop if all key cells in the next row are empty
+            next_row = table[i + 1] if i + 1 < len(table) else ()
+            if all(cell(next_row, c) in [None, "", " "] for c in [product_idx, qty_idx]):
                 break
 
         if rows:
@@ -129,9 +79,40 @@ def parse_satra(file_path, path_config):
                 "store": warehouse,
                 "rows": rows
             }
-            write_json_output(result, OUTPUT_DIR, base_name, warehouse.lower(), logger)
+            records.append((f"{base_name}_{warehouse.lower()}", result))
+    return records
+
+@file_span("satra")
+def parse_satra(file_path, path_config, source=None):
+    filename = os.path.basename(file_path)
+
+    # Column letters and the date cell come pre-resolved from the config registry
+    rules = load_rules("satra")
+
+    LOG_PATH = os.path.join(path_config["output_satra"], "parse_satra.log")
+    logger = get_logger("satra_parser", LOG_PATH)
+    logger.info(f"Parsing file: {filename}")
 
+    try:
+        with span("open") as s:
+            sheet = read_sheet(file_path if source is None else source, cells=[rules.date_cell], min_row=rules.first_row)
+            s.rows = len(sheet.rows)
+    except Exception as e:
+        logger.error(f"Failed to open workbook: {e}")
+        raise
+
+    delivery_date_raw = sheet.cells[rules.date_cell]
+    delivery_date = parse_delivery_date(delivery_date_raw)
+    logger.debug("Raw delivery date value: %r", delivery_date_raw)
+
+    with span("normalise") as s:
+        records = warehouse_records(sheet.rows, rules, delivery_date, filename)
+        s.rows = row_count = sum(len(r["rows"]) for _, r in records)
+
+    with span("write", rows=row_count):
+        outputs = save_output(records, path_config, filename, logger)
     print_last_log_lines(LOG_PATH, 10)
+    return outputs
 
 if __name__ == "__main__":
     with open("config/paths.json", encoding="utf-8") as f:
@@ -140,4 +121,7 @@ if __name__ == "__main__":
     input_dir = path_config["input_satra"]
     for fname in os.listdir(input_dir):
         if fname.lower().endswith((".xlsx", ".xls")):
-            parse_satra(os.path.join(input_dir, fname), path_config)
+            try:
+                parse_satra(os.path.join(input_dir, fname), path_config)
+            except Exception as e:
+                print(f"[ERROR] {fname}: {e}")
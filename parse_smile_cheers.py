@@ -2,52 +2,31 @@
 
 import os
 import json
-import logging
-import pandas as pd
 from datetime import datetime
 
-def setup_logger(log_path):
-    os.makedirs(os.path.dirname(log_path), exist_ok=True)
-    logger = logging.getLogger("smile_cheers_parser")
-    logger.setLevel(logging.INFO)
-    fh = logging.FileHandler(log_path, encoding='utf-8')
-    fh.setLevel(logging.INFO)
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    fh.setFormatter(formatter)
-    if logger.hasHandlers():
-        logger.handlers.clear()
-    logger.addHandler(fh)
-    return logger
+from log_utils import get_logger, print_last_log_lines
+from order_store import save_records
+from excel_reader import read_sheet, rows_to_frame, normalise_rows
+from instrument import span, file_span
+from config_registry import load_config
 
-def print_last_log_lines(log_path, n=10):
-    if not os.path.exists(log_path):
-        print("No log file found.")
-        return
-    with open(log_path, encoding='utf-8') as f:
-        lines = f.readlines()
-        print("".join(lines[-n:]))
+# Bump whenever a change alters the normalised output
+PARSER_VERSION = "1"
 
-def write_json_output(data, output_dir, original_filename, logger):
-    os.makedirs(output_dir, exist_ok=True)
-    base_name = os.path.splitext(original_filename)[0]
-    json_filename = base_name + ".json"
-    output_path = os.path.join(output_dir, json_filename)
-    try:
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        logger.info(f"Output written: {output_path}")
-    except Exception as e:
-        logger.error(f"Failed to write JSON output: {e}")
+def save_output(records, path_config, filename, logger):
+    outputs = save_records(path_config, "smile_cheers", records, source_file=filename)
+    for output in outputs:
+        logger.info(f"Output written: {output}")
+    return outputs
 
-def parse_smile_cheers(file_path, path_config):
+@file_span("smile_cheers")
+def parse_smile_cheers(file_path, path_config, source=None):
     filename = os.path.basename(file_path)
 
-    with open("config/column_map_smile_cheers.json", encoding='utf-8') as f:
-        config = json.load(f)
+    config = load_config("smile_cheers")
 
     LOG_PATH = os.path.join(path_config["output_smile_cheers"], "parse_smile_cheers.log")
-    OUTPUT_DIR = path_config["output_smile_cheers"]
-    logger = setup_logger(LOG_PATH)
+    logger = get_logger("smile_cheers_parser", LOG_PATH)
     logger.info(f"Parsing file: {filename}")
 
     sheet_name = config["sheet_name"]
@@ -56,40 +35,24 @@ def parse_smile_cheers(file_path, path_config):
     tax = config["tax"]
 
     try:
-        df = pd.read_excel(file_path, sheet_name=sheet_name, header=header_row, engine="openpyxl")
-        wb = pd.ExcelFile(file_path, engine="openpyxl")
-        delivery_date_raw = wb.book[sheet_name][config["delivery_date_cell"]].value
+        date_cell = config["delivery_date_cell"]
+        with span("open") as s:
+            sheet = read_sheet(file_path if source is None else source, sheet_name=sheet_name, cells=[date_cell])
+            df = rows_to_frame(sheet.rows, header_row)
+            s.rows = len(df)
+        delivery_date_raw = sheet.cells[date_cell]
         delivery_date = delivery_date_raw.strftime("%Y-%m-%d") if isinstance(delivery_date_raw, datetime) else None
     except Exception as e:
         logger.error(f"Failed to read file or delivery date: {e}")
-        return
-
-    rows = []
-    for _, row in df.iterrows():
-        product = str(row.get(col_map["product_name"])).strip()
-        if not product or product.lower() in ["nan", "tổng cộng"]:
-            continue
-
-        try:
-            qty = float(row.get(col_map["qty"]))
-        except:
-            continue
-
-        try:
-            unit_price = float(row.get(col_map["unit_price"]))
-        except:
-            unit_price = None
+        raise
 
-        rows.append({
-            "product_name": product,
-            "qty": qty,
-            "unit_price": unit_price,
-            "tax": tax
-        })
+    with span("normalise") as s:
+        rows = normalise_rows(df, col_map["product_name"], col_map["qty"], col_map["unit_price"], tax)
+        s.rows = len(rows)
 
     if not rows:
         logger.warning(f"No valid rows parsed in {filename}")
-        return
+        return []
 
     result = {
         "delivery_date": delivery_date,
@@ -97,8 +60,10 @@ def parse_smile_cheers(file_path, path_config):
         "rows": rows
     }
 
-    write_json_output(result, OUTPUT_DIR, filename, logger)
+    with span("write", rows=len(rows)):
+        outputs = save_output([(os.path.splitext(filename)[0], result)], path_config, filename, logger)
     print_last_log_lines(LOG_PATH, 10)
+    return outputs
 
 if __name__ == "__main__":
     with open("config/paths.json", encoding="utf-8") as f:
@@ -107,4 +72,7 @@ if __name__ == "__main__":
     input_dir = path_config["input_smile_cheers"]
     for fname in os.listdir(input_dir):
         if fname.lower().endswith((".xlsx", ".xls")):
-            parse_smile_cheers(os.path.join(input_dir, fname), path_config)
+            try:
+                parse_smile_cheers(os.path.join(input_dir, fname), path_config)
+            except Exception as e:
+                print(f"[ERROR] {fname}: {e}")
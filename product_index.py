@@ -0,0 +1,265 @@
+# product_index.py
+#
+# Resolves the product names the parsers read (CB "Dua leo 300g", Satra
+# "RC-DƯA LEO BABY VIETGAP", Mini "F-Dua leo baby DL vi 500g-DXF", OCR lines,
+# ...) to the SKUs of config/product_catalog.json:
+#
+#   {"products": [{"sku": "DXF-DUALEO-300", "name": "Dưa leo 300g",
+#                  "aliases": ["Dua leo 300g", "RC-DƯA LEO VIETGAP"]}]}
+#
+#   python product_index.py resolve "RL-CẢI BÓ XÔI ĐL 300G" "Cai bo xoi 300g"
+#   python product_index.py unmatched
+#   python product_index.py bootstrap    # add every unmatched stored name to the catalogue
+
+import os
+import re
+import sys
+import json
+import argparse
+import unicodedata
+from difflib import SequenceMatcher
+from collections import Counter, namedtuple
+from functools import lru_cache
+
+CATALOG_PATH = "config/product_catalog.json"
+
+# Retailer prefixes/suffixes and packaging words that say nothing about the product
+NOISE_TOKENS = {
+    "rl", "rc", "f", "bs", "cb", "dxf", "dx", "hn", "vietgap", "goi", "ea", "up", "dl", "vi",
+}
+UNIT_GRAMS = {"g": 1, "gr": 1, "gram": 1, "kg": 1000}
+
+# Letters and numbers are separate tokens, so "khay500g" gives "khay" and "500g"
+TOKEN_PATTERN = re.compile(r"[a-z]+|[0-9]+(?:[.,][0-9]+)?[a-z]*")
+SIZE_PATTERN = re.compile(r"^(\d+(?:[.,]\d+)?)(g|gr|gram|kg)$")
+
+MIN_SCORE = 0.8
+# A fuzzy match pairs every token with one on the other side; words shorter than
+# this, and numbers, must be spelled the same ("dau"/"dua" are different products)
+MIN_FUZZY_TOKEN = 4
+TOKEN_SCORE = 0.75
+
+Match = namedtuple("Match", ["sku", "name", "score"])
+
+def fold(text):
+    """Lower-case ASCII form of a Vietnamese name: "Cải Thìa ĐL" -> "cai thia dl"."""
+    text = str(text).replace("đ", "d").replace("Đ", "D")
+    text = unicodedata.normalize("NFD", text)
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+def tokenize(name):
+    """(name tokens, size in grams or None); noise tokens dropped, "300gr"/"0.3kg" -> 300."""
+    raw = TOKEN_PATTERN.findall(fold(name))
+    tokens = []
+    size = None
+    for i, token in enumerate(raw):
+        match = SIZE_PATTERN.match(token)
+        # "500 g" written with a space
+        if not match and token.replace(".", "").replace(",", "").isdigit() and i + 1 < len(raw) and raw[i + 1] in UNIT_GRAMS:
+            match = SIZE_PATTERN.match(token + raw[i + 1])
+        if match:
+            size = round(float(match.group(1).replace(",", ".")) * UNIT_GRAMS[match.group(2)])
+            continue
+        if token in UNIT_GRAMS or token in NOISE_TOKENS:
+            continue
+        tokens.append(token)
+    return tokens, size
+
+def tokens_agree(tokens, other):
+    """True when each token pairs off with one of other's: equal, or a close misspelling
+    of a long word. A token left over on either side ("baby", "mini") is a different product."""
+    unused = list(other)
+    for token in tokens:
+        if token in unused:
+            unused.remove(token)
+            continue
+        if len(token) < MIN_FUZZY_TOKEN or not token.isalpha():
+            return False
+        close = [t for t in unused if len(t) >= MIN_FUZZY_TOKEN and t.isalpha()
+                 and SequenceMatcher(None, token, t).ratio() >= TOKEN_SCORE]
+        if not close:
+            return False
+        unused.remove(close[0])
+    return not unused
+
+def trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class ProductIndex:
+    """Catalogue lookup: exact folded-key hits first, then a trigram inverted index.
+
+    Each catalogue name and alias is reduced to its folded, noise-free token
+    key. A raw name whose key is known resolves with score 1.0; otherwise the
+    candidates sharing trigrams are scored by Dice coefficient and the best
+    one at or above min_score wins. A fuzzy match also needs the same pack
+    size (or none on both sides) and every token paired by tokens_agree, so a
+    variant or size word never folds one product into another. Results are
+    memoised per raw name, so a run only scores each distinct spelling once.
+    """
+
+    def __init__(self, products, min_score=MIN_SCORE, cache_size=65536):
+        self.min_score = min_score
+        self.entries = []        # (sku, canonical name, key, size, trigrams, tokens)
+        self.exact = {}          # (key, size) -> entry id
+        self.by_key = {}         # key -> first entry id, for names without a pack size
+        self.postings = {}       # trigram -> [entry id]
+        for product in products:
+            for name in [product["name"]] + list(product.get("aliases", [])):
+                self._add(product["sku"], product["name"], name)
+        self.resolve = lru_cache(maxsize=cache_size)(self._resolve)
+
+    def _add(self, sku, canonical, name):
+        tokens, size = tokenize(name)
+        key = " ".join(tokens)
+        if not key or (key, size) in self.exact:
+            return
+        entry_id = len(self.entries)
+        grams = trigrams(key)
+        self.entries.append((sku, canonical, key, size, grams, tokens))
+        self.exact[(key, size)] = entry_id
+        self.by_key.setdefault(key, entry_id)
+        for gram in grams:
+            self.postings.setdefault(gram, []).append(entry_id)
+
+    def _resolve(self, raw_name):
+        tokens, size = tokenize(raw_name)
+        key = " ".join(tokens)
+        if not key:
+            return None
+
+        entry_id = self.exact.get((key, size))
+        if entry_id is None and size is None:
+            entry_id = self.by_key.get(key)
+        if entry_id is not None:
+            sku, canonical = self.entries[entry_id][:2]
+            return Match(sku, canonical, 1.0)
+
+        grams = trigrams(key)
+        shared = Counter()
+        for gram in grams:
+            for candidate in self.postings.get(gram, ()):
+                shared[candidate] += 1
+
+        best = None
+        for candidate, count in shared.items():
+            sku, canonical, _, cand_size, cand_grams, cand_tokens = self.entries[candidate]
+            if size != cand_size:
+                continue
+            score = 2 * count / (len(grams) + len(cand_grams))
+            if score < self.min_score or (best is not None and score <= best.score):
+                continue
+            if tokens_agree(tokens, cand_tokens):
+                best = Match(sku, canonical, round(score, 3))
+        return best
+
+def load_catalog(path=CATALOG_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def load_index(path=CATALOG_PATH):
+    """ProductIndex for the catalogue file, or None when there is no catalogue."""
+    catalog = load_catalog(path)
+    if catalog is None:
+        return None
+    return ProductIndex(catalog.get("products", []), catalog.get("min_score", MIN_SCORE))
+
+def resolve_names(names, index):
+    """{raw name: Match or None} for every distinct name in an iterable (e.g. a DataFrame column)."""
+    return {name: index.resolve(name) for name in set(names) if isinstance(name, str)}
+
+def new_sku(tokens, size, taken):
+    """"DXF-DUALEO-300" style SKU for a bootstrapped product, unique among taken."""
+    base = "DXF-" + re.sub(r"[^A-Z0-9]", "", "".join(tokens).upper()) + (f"-{size}" if size else "")
+    sku, n = base, 2
+    while sku in taken:
+        sku, n = f"{base}-{n}", n + 1
+    return sku
+
+def bootstrap(catalog, names):
+    """Add the names (most common first) the catalogue does not resolve yet.
+
+    Each becomes an alias of a product added earlier in the same pass when the
+    matcher pairs them (same key, or a misspelling of it), otherwise of a new
+    product named after its folded key and size ("Dua leo baby 500g").
+    Returns (products added, aliases added).
+    """
+    products = catalog.setdefault("products", [])
+    index = ProductIndex(products, catalog.get("min_score", MIN_SCORE))
+    unmatched = [name for name in names if index.resolve(name) is None]
+    by_sku = {product["sku"]: product for product in products}
+    added = aliased = 0
+    for name in unmatched:
+        match = index._resolve(name)
+        if match is not None:
+            by_sku[match.sku].setdefault("aliases", []).append(name)
+            index._add(match.sku, match.name, name)
+            aliased += 1
+            continue
+        tokens, size = tokenize(name)
+        if not tokens:
+            continue
+        canonical = " ".join(tokens).capitalize() + (f" {size}g" if size else "")
+        product = {"sku": new_sku(tokens, size, by_sku), "name": canonical, "aliases": [name]}
+        products.append(product)
+        by_sku[product["sku"]] = product
+        index._add(product["sku"], canonical, name)
+        added += 1
+    return added, aliased
+
+def save_catalog(catalog, path=CATALOG_PATH):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(catalog, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    os.replace(tmp, path)
+
+def stored_names(path_config):
+    """Counter of (retailer, product name) -> order lines in the order store."""
+    from consolidate import load_order_table
+    df = load_order_table(path_config)
+    return Counter(df.groupby(["retailer", "product_name"]).size().to_dict())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resolve product names against the product catalogue.")
+    parser.add_argument("--catalog", default=CATALOG_PATH, help="Product catalogue file")
+    parser.add_argument("--paths", default="config/paths.json", help="Path config file")
+    sub = parser.add_subparsers(dest="command", required=True)
+    res = sub.add_parser("resolve", help="Resolve the given names")
+    res.add_argument("names", nargs="+")
+    sub.add_parser("unmatched", help="List stored product names with no catalogue match")
+    sub.add_parser("bootstrap", help="Add every unmatched stored name to the catalogue (created if missing)")
+    args = parser.parse_args(argv)
+
+    from consolidate import load_path_config
+    if args.command == "bootstrap":
+        catalog = load_catalog(args.catalog) or {"products": []}
+        lines = Counter()
+        for (_, name), count in stored_names(load_path_config(args.paths)).items():
+            lines[name] += count
+        added, aliased = bootstrap(catalog, [name for name, _ in lines.most_common()])
+        save_catalog(catalog, args.catalog)
+        print(f"{added} products and {aliased} aliases added to {args.catalog} "
+              f"({len(catalog['products'])} products)")
+        return 0
+
+    index = load_index(args.catalog)
+    if index is None:
+        print(f"No catalogue at {args.catalog}")
+        return 1
+
+    if args.command == "resolve":
+        for name in args.names:
+            match = index.resolve(name)
+            print(f"{name} -> {f'{match.sku} ({match.name}, {match.score})' if match else 'no match'}")
+        return 0
+
+    for (retailer, name), lines in sorted(stored_names(load_path_config(args.paths)).items()):
+        if index.resolve(name) is None:
+            print(f"{retailer}\t{lines}\t{name}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+# reconcile.py
+#
+# Matches DU KIEN forecasts against CHOT confirmations per delivery day and
+# keeps a picking list per day up to date. Each (retailer, delivery date) is
+# reconciled on its own, so a confirmation landing only rewrites that
+# retailer's section of the day:
+#
+#   output/reconciliation/<date>.json          picking list + deltas per retailer
+#   output/reconciliation/<date>_picking.csv   the picking list, one row per retailer/product
+#   output/reconciliation/<date>_deltas.csv    confirmed minus forecast, per retailer/product
+#
+#   python reconcile.py --date 2025-07-10     # rebuild one day (all retailers)
+#   python reconcile.py                       # rebuild every day in the store
+
+import os
+import re
+import sys
+import json
+import argparse
+from datetime import datetime
+
+import pandas as pd
+
+from consolidate import load_order_table, load_path_config
+from product_index import CATALOG_PATH, fold, load_index
+
+DEFAULT_OUTPUT = "output/reconciliation/"
+
+# Which lines make up the picking list when a retailer/day has several kinds:
+# a confirmation replaces the forecast; firm orders with no DU KIEN/CHOT keyword count as placed
+BASIS_ORDER = ["confirmed", "unknown", "forecast"]
+
+_index = (None, None)   # (catalogue mtime, ProductIndex)
+
+def output_dir_of(path_config):
+    return path_config.get("output_reconciliation", DEFAULT_OUTPUT)
+
+def product_index():
+    """The catalogue's ProductIndex, rebuilt only when the catalogue file changes; None without one."""
+    global _index
+    try:
+        stamp = os.stat(CATALOG_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if _index[0] != stamp:
+        _index = (stamp, load_index())
+    return _index[1]
+
+def product_key(name, index):
+    """(key, sku, display name): the catalogue SKU when the name resolves, else the folded name."""
+    match = index.resolve(name) if index is not None else None
+    if match is not None:
+        return match.sku, match.sku, match.name
+    return re.sub(r"\s+", " ", fold(name)).strip(), None, str(name).strip()
+
+def totals_by_product(lines, index):
+    """{order type: {product key: [sku, name, qty]}}, summing every store/slip of the day."""
+    totals = {}
+    for order_type, name, qty in lines:
+        if not isinstance(name, str) or pd.isna(qty):
+            continue
+        key, sku, display = product_key(name, index)
+        # numpy scalars from the order table don't serialise; keep ints as ints
+        qty = qty.item() if hasattr(qty, "item") else qty
+        entry = totals.setdefault(order_type, {}).setdefault(key, [sku, display, 0])
+        entry[2] += qty
+    return totals
+
+def delta_status(forecast, confirmed):
+    if forecast is None:
+        return "added"
+    if confirmed is None:
+        return "dropped"
+    return "unchanged" if forecast == confirmed else "changed"
+
+def reconcile_group(lines, index=None):
+    """Picking list and deltas for one retailer and delivery day.
+
+    lines are (order_type, product_name, qty) tuples. Forecast and confirmed
+    totals are hash-joined on the product key; deltas are only produced once
+    a confirmation exists.
+    """
+    totals = totals_by_product(lines, index)
+    basis = next((b for b in BASIS_ORDER if totals.get(b)), None)
+    picking = [
+        {"product_key": key, "sku": sku, "product_name": name, "qty": qty}
+        for key, (sku, name, qty) in sorted((totals.get(basis) or {}).items())
+    ]
+
+    deltas = []
+    forecast = totals.get("forecast", {})
+    confirmed = totals.get("confirmed", {})
+    if confirmed:
+        for key in sorted(forecast.keys() | confirmed.keys()):
+            f, c = forecast.get(key), confirmed.get(key)
+            sku, name = (c or f)[:2]
+            f_qty = f[2] if f else None
+            c_qty = c[2] if c else None
+            deltas.append({
+                "product_key": key, "sku": sku, "product_name": name,
+                "forecast_qty": f_qty, "confirmed_qty": c_qty,
+                "delta": (c_qty or 0) - (f_qty or 0),
+                "status": delta_status(f_qty, c_qty),
+            })
+    return {"basis": basis, "picking": picking, "deltas": deltas}
+
+def day_path(output_dir, date):
+    return os.path.join(output_dir, f"{date}.json")
+
+def load_day(output_dir, date):
+    try:
+        with open(day_path(output_dir, date), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"delivery_date": date, "retailers": {}}
+
+def write_json_atomic(data, path):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+def write_day(day, output_dir):
+    """Save the day's JSON and regenerate its two CSVs from it (one day's rows, no store reads)."""
+    os.makedirs(output_dir, exist_ok=True)
+    date = day["delivery_date"]
+    day["updated_at"] = datetime.now().isoformat(timespec="seconds")
+    write_json_atomic(day, day_path(output_dir, date))
+
+    picking, deltas = [], []
+    for retailer, section in sorted(day["retailers"].items()):
+        picking += [{"retailer": retailer, "basis": section["basis"], **line} for line in section["picking"]]
+        deltas += [{"retailer": retailer, **line} for line in section["deltas"]]
+    pd.DataFrame(picking, columns=["retailer", "basis", "product_key", "sku", "product_name", "qty"]).to_csv(
+        os.path.join(output_dir, f"{date}_picking.csv"), index=False, encoding="utf-8-sig")
+    pd.DataFrame(deltas, columns=["retailer", "product_key", "sku", "product_name", "forecast_qty",
+                                  "confirmed_qty", "delta", "status"]).to_csv(
+        os.path.join(output_dir, f"{date}_deltas.csv"), index=False, encoding="utf-8-sig")
+
+def group_lines(df):
+    return zip(df["order_type"], df["product_name"], df["qty"])
+
+def update(path_config, groups):
+    """Re-reconcile only the given (retailer, delivery_date) pairs and rewrite their days.
+
+    Returns {(retailer, date): section} for the groups that were updated.
+    """
+    output_dir = output_dir_of(path_config)
+    index = product_index()
+    by_date = {}
+    for retailer, date in groups:
+        if date:
+            by_date.setdefault(date, set()).add(retailer)
+
+    updated = {}
+    for date, retailers in sorted(by_date.items()):
+        # Only the retailers being reconciled; the rest of the day's sections are kept as they are
+        df = load_order_table(path_config, [date], retailers=sorted(retailers))
+        day = load_day(output_dir, date)
+        for retailer in sorted(retailers):
+            section = reconcile_group(group_lines(df[df["retailer"] == retailer]), index)
+            section["updated_at"] = datetime.now().isoformat(timespec="seconds")
+            if section["basis"] is None:
+                day["retailers"].pop(retailer, None)
+            else:
+                day["retailers"][retailer] = section
+            updated[(retailer, date)] = section
+        write_day(day, output_dir)
+    return updated
+
+def rebuild(path_config, dates=None):
+    """Reconcile every retailer of the given days (every stored day when None) from scratch."""
+    output_dir = output_dir_of(path_config)
+    index = product_index()
+    df = load_order_table(path_config, dates)
+    days = 0
+    for date, day_df in df.groupby("delivery_date", sort=True):
+        day = {"delivery_date": date, "retailers": {}}
+        for retailer, group in day_df.groupby("retailer", sort=True):
+            section = reconcile_group(group_lines(group), index)
+            if section["basis"] is not None:
+                section["updated_at"] = datetime.now().isoformat(timespec="seconds")
+                day["retailers"][retailer] = section
+        write_day(day, output_dir)
+        days += 1
+    return days
+
+def summarise(section):
+    changed = [d for d in section["deltas"] if d["status"] != "unchanged"]
+    return f"basis={section['basis']} products={len(section['picking'])} deltas={len(changed)}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reconcile forecasts with confirmations and build picking lists.")
+    parser.add_argument("--paths", default="config/paths.json", help="Path config file")
+    parser.add_argument("--date", action="append", help="Only this delivery date (repeatable)")
+    parser.add_argument("--retailer", action="append", help="With --date: only update this retailer's section")
+    args = parser.parse_args(argv)
+
+    path_config = load_path_config(args.paths)
+    if args.retailer:
+        if not args.date:
+            parser.error("--retailer needs --date")
+        updated = update(path_config, [(r, d) for r in args.retailer for d in args.date])
+        for (retailer, date), section in sorted(updated.items()):
+            print(f"{date} {retailer}: {summarise(section)}")
+        return 0
+
+    days = rebuild(path_config, args.date)
+    print(f"Reconciled {days} delivery days → {output_dir_of(path_config)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
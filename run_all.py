@@ -0,0 +1,246 @@
+# run_all.py
+
+import os
+import sys
+import json
+import time
+import argparse
+import importlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from manifest import Manifest, config_hash, file_fingerprint
+from order_store import delete_source
+from classify import classify_dir
+import instrument
+
+# retailer -> parser module, per-file entry point and accepted input files
+RETAILERS = {
+    "cb": {
+        "module": "parse_cb",
+        "func": "parse_cb",
+        "config": "config/column_map_cb.json",
+        "extensions": (".xlsx", ".xls"),
+    },
+    "satra": {
+        "module": "parse_satra",
+        "func": "parse_satra",
+        "config": "config/column_map_satra.json",
+        "extensions": (".xlsx", ".xls"),
+    },
+    "smile_cheers": {
+        "module": "parse_smile_cheers",
+        "func": "parse_smile_cheers",
+        "config": "config/column_map_smile_cheers.json",
+        "extensions": (".xlsx", ".xls"),
+    },
+    "lotte": {
+        "module": "parse_lotte",
+        "func": "process_file",
+        "config": "config/column_map_lotte.json",
+        "extensions": (".xls", ".xlsx"),
+    },
+    "mini": {
+        "module": "parse_mini",
+        "func": "process_file",
+        "config": "config/column_map_mini.json",
+        "extensions": (".pdf",),
+        "name_contains": "DONG XANH FOOD",
+    },
+    "genshai": {
+        "module": "parse_genshai",
+        "func": "process_file",
+        "config": "config/column_map_genshai.json",
+        "extensions": (".pdf",),
+    },
+    "coop": {
+        "module": "parse_coop_image",
+        "func": "process_file",
+        "config": "config/column_map_coop.json",
+        "extensions": (".jpg", ".jpeg", ".png"),
+    },
+}
+
+def load_path_config(path="config/paths.json"):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["paths"]
+
+def discover_inputs(path_config, retailers=None):
+    jobs = []
+    for retailer, spec in RETAILERS.items():
+        if retailers and retailer not in retailers:
+            continue
+        input_dir = path_config.get(f"input_{retailer}")
+        if not input_dir or not os.path.isdir(input_dir):
+            continue
+        for fname in sorted(os.listdir(input_dir)):
+            if not fname.lower().endswith(spec["extensions"]):
+                continue
+            if spec.get("name_contains") and spec["name_contains"] not in fname.upper():
+                continue
+            jobs.append((retailer, os.path.join(input_dir, fname)))
+    return jobs + discover_inbox(path_config, retailers)
+
+def discover_inbox(path_config, retailers=None, unrecognised=None):
+    """Jobs for files dropped into the shared inbox, routed by content rather than by folder."""
+    inbox = path_config.get("input_inbox")
+    if not inbox or not os.path.isdir(inbox):
+        return []
+    jobs = []
+    for c in classify_dir(inbox):
+        if c.retailer is None:
+            if unrecognised is not None:
+                unrecognised.append(c)
+        elif not retailers or c.retailer in retailers:
+            jobs.append((c.retailer, c.path))
+    return jobs
+
+def run_one(retailer, file_path, path_config, source=None):
+    """Parse one input in this process. With source (bytes or a file object) the parser reads
+    the input from memory and file_path only names it; otherwise the file is fingerprinted for
+    the manifest before it is parsed."""
+    spec = RETAILERS[retailer]
+    start = time.perf_counter()
+    outputs = []
+    error = None
+    fingerprint = None
+    try:
+        if source is None:
+            fingerprint = file_fingerprint(file_path)
+        module = importlib.import_module(spec["module"])
+        outputs = getattr(module, spec["func"])(file_path, path_config, source=source) or []
+        status = "ok" if outputs else "empty"
+        if status == "empty":
+            # Nothing parsed this time: rows stored by an earlier parse are stale
+            delete_source(path_config, retailer, os.path.basename(file_path))
+    except Exception as e:
+        status = "error"
+        error = f"{type(e).__name__}: {e}"
+
+    return {
+        "retailer": retailer,
+        "file": file_path,
+        "status": status,
+        "seconds": round(time.perf_counter() - start, 3),
+        "outputs": [str(p) for p in outputs],
+        "error": error,
+        "fingerprint": fingerprint,
+    }
+
+def parser_version(retailer):
+    module = importlib.import_module(RETAILERS[retailer]["module"])
+    return getattr(module, "PARSER_VERSION", "0")
+
+def retailer_config_hash(retailer):
+    return config_hash([RETAILERS[retailer]["config"]], parser_version(retailer))
+
+def filter_changed(jobs, manifest, hashes):
+    """Drop jobs whose input, parser version and config all match the manifest."""
+    pending = []
+    skipped = 0
+    for retailer, file_path in jobs:
+        if manifest.is_current(file_path, parser_version(retailer), hashes[retailer]):
+            skipped += 1
+        else:
+            pending.append((retailer, file_path))
+    return pending, skipped
+
+def run_all(path_config, workers=None, retailers=None, force=False):
+    jobs = discover_inputs(path_config, retailers)
+    unrecognised = []
+    discover_inbox(path_config, unrecognised=unrecognised)
+    for c in unrecognised:
+        print(f"[SKIP] inbox/{os.path.basename(c.path)}: {c.reason}")
+    if not jobs:
+        print("No input files found.")
+        return []
+
+    manifest = Manifest(path_config.get("manifest", "output/manifest.json"))
+    hashes = {retailer: retailer_config_hash(retailer) for retailer, _ in jobs}
+    if not force:
+        jobs, skipped = filter_changed(jobs, manifest, hashes)
+        if skipped:
+            print(f"Skipping {skipped} unchanged files")
+    if not jobs:
+        manifest.save()
+        return []
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(run_one, retailer, file_path, path_config): (retailer, file_path)
+            for retailer, file_path in jobs
+        }
+        for future in as_completed(futures):
+            retailer, file_path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # Worker died (e.g. killed by the OS) before it could report back
+                result = {
+                    "retailer": retailer,
+                    "file": file_path,
+                    "status": "error",
+                    "seconds": None,
+                    "outputs": [],
+                    "error": f"{type(e).__name__}: {e}",
+                }
+            results.append(result)
+            if result["status"] != "error":
+                manifest.record(file_path, retailer, parser_version(retailer),
+                                hashes[retailer], result["outputs"], result.get("fingerprint"))
+            else:
+                manifest.forget(file_path)
+            print(f"[{result['status'].upper()}] {retailer}/{os.path.basename(file_path)} "
+                  f"({result['seconds']}s)")
+
+    manifest.prune()
+    manifest.save()
+    return results
+
+def write_report(results, report_path):
+    os.makedirs(os.path.dirname(report_path) or ".", exist_ok=True)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+def print_summary(results, wall_time):
+    failures = [r for r in results if r["status"] == "error"]
+    empty = [r for r in results if r["status"] == "empty"]
+    print(f"\nProcessed {len(results)} files in {wall_time:.2f}s "
+          f"({len(results) - len(failures) - len(empty)} ok, {len(empty)} empty, {len(failures)} failed)")
+    for r in failures:
+        print(f"[ERROR] {r['retailer']}/{os.path.basename(r['file'])}: {r['error']}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run every retailer parser across a process pool.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--retailer", action="append", choices=sorted(RETAILERS),
+                        help="Only process this retailer (repeatable)")
+    parser.add_argument("--paths", default="config/paths.json", help="Path config file")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-parse every input even if the manifest says it is current")
+    parser.add_argument("--report", default="output/run_report.json",
+                        help="Where to write the per-file timing/failure report")
+    parser.add_argument("--metrics", nargs="?", const="output/metrics.jsonl",
+                        help="Append per-stage timing/memory spans to this JSONL file "
+                             "(default output/metrics.jsonl)")
+    parser.add_argument("--profile", choices=instrument.PROFILE_MODES,
+                        help="With --metrics: cProfile each file, or trace allocations with tracemalloc")
+    args = parser.parse_args(argv)
+
+    if args.metrics:
+        # Set before the pool starts so every worker inherits it
+        instrument.configure(args.metrics, args.profile)
+
+    path_config = load_path_config(args.paths)
+    start = time.perf_counter()
+    results = run_all(path_config, workers=args.workers, retailers=args.retailer,
+                      force=args.force)
+    wall_time = time.perf_counter() - start
+
+    write_report(results, args.report)
+    print_summary(results, wall_time)
+    return 1 if any(r["status"] == "error" for r in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
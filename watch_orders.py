@@ -0,0 +1,283 @@
+# watch_orders.py
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import importlib
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import run_all
+from manifest import Manifest
+from consolidate import consolidate
+import reconcile
+from order_store import delete_source, record_dates, source_dates, split_ref
+
+def load_cutoffs(path="config/cutoffs.json"):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def cutoff_at(value, day):
+    hour, minute = (int(p) for p in value.split(":"))
+    return datetime.combine(day, datetime.min.time()).replace(hour=hour, minute=minute)
+
+def warm_up():
+    # Pool initializer: pay the pandas/openpyxl/pdfplumber/cv2 import cost once per worker
+    for spec in run_all.RETAILERS.values():
+        importlib.import_module(spec["module"])
+
+def delivery_dates_of(outputs):
+    dates = record_dates(outputs)
+    for path in outputs:
+        if split_ref(path):
+            continue
+        try:
+            with open(path, encoding="utf-8") as f:
+                dates.add(json.load(f).get("delivery_date"))
+        except (OSError, ValueError):
+            continue
+    dates.discard(None)
+    return dates
+
+class OrderWatcher:
+    """Polls the input folders, parses files once they stop changing, and keeps daily totals fresh.
+
+    A file is picked up after it has been seen with the same size and mtime for
+    debounce_seconds. Within cutoff_guard_seconds of a retailer's cut-off the
+    debounce drops to a single unchanged poll and that retailer's jobs jump the
+    queue; at the cut-off itself anything still outstanding is submitted and
+    that retailer's parses get up to cutoff_wait_seconds to finish and be
+    consolidated. Parses still running after that are logged and picked up by
+    the following ticks like any other job.
+    """
+
+    def __init__(self, path_config, settings, workers=None):
+        self.path_config = path_config
+        self.poll_interval = settings.get("poll_interval", 1.0)
+        self.debounce = settings.get("debounce_seconds", 2.0)
+        self.guard = timedelta(seconds=settings.get("cutoff_guard_seconds", 60))
+        self.cutoff_wait = settings.get("cutoff_wait_seconds", 30)
+        self.cutoffs = settings.get("cutoffs", {})
+
+        self.manifest = Manifest(path_config.get("manifest", "output/manifest.json"))
+        self.hashes = self.config_hashes()
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=warm_up)
+
+        self.seen = {}        # path -> ((size, mtime), first seen with that signature)
+        self.failed = {}      # path -> (signature that failed, retailer), retried once the file changes
+        self.in_flight = {}   # future -> (retailer, path, config hash, dates stored before the parse)
+        self.dirty_dates = set()
+        self.dirty_groups = set()   # (retailer, delivery_date) whose forecast/confirmation changed
+        self.last_tick = datetime.now()
+
+    def config_hashes(self):
+        # Re-read every tick so a column map edited while watching re-parses that retailer's files
+        return {r: run_all.retailer_config_hash(r) for r in run_all.RETAILERS}
+
+    def mark_dirty(self, retailer, dates):
+        self.dirty_dates |= dates
+        self.dirty_groups |= {(retailer, date) for date in dates}
+
+    def next_cutoff(self, retailer, now):
+        times = self.cutoffs.get(retailer, [])
+        candidates = [cutoff_at(t, now.date()) for t in times]
+        candidates += [cutoff_at(t, now.date() + timedelta(days=1)) for t in times]
+        upcoming = [c for c in candidates if c >= now]
+        return min(upcoming) if upcoming else datetime.max
+
+    def in_guard_window(self, retailer, now):
+        return self.next_cutoff(retailer, now) - now <= self.guard
+
+    def is_current(self, retailer, path):
+        return self.manifest.is_current(path, run_all.parser_version(retailer), self.hashes[retailer])
+
+    def scan(self, now, retailer=None, ignore_debounce=False):
+        queued = {path for _, path, _, _ in self.in_flight.values()}
+        ready = []
+        for job_retailer, path in run_all.discover_inputs(self.path_config, [retailer] if retailer else None):
+            if path in queued:
+                continue
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            sig = (st.st_size, st.st_mtime)
+            if self.failed.get(path, (None,))[0] == sig:
+                continue
+
+            previous = self.seen.get(path)
+            if previous is None or previous[0] != sig:
+                # New or still being written: wait until it is seen unchanged
+                self.seen[path] = (sig, time.monotonic())
+                if not ignore_debounce:
+                    continue
+            elif not ignore_debounce:
+                debounce = 0 if self.in_guard_window(job_retailer, now) else self.debounce
+                if time.monotonic() - previous[1] < debounce:
+                    continue
+
+            if self.is_current(job_retailer, path):
+                continue
+            ready.append((job_retailer, path))
+
+        # Jobs whose retailer has the nearest cut-off go first
+        ready.sort(key=lambda job: self.next_cutoff(job[0], now))
+        return ready
+
+    def submit(self, jobs):
+        for retailer, path in jobs:
+            # What the input stored before: those days change too if it now parses to other dates or nothing
+            previous = source_dates(self.path_config, retailer, os.path.basename(path))
+            future = self.pool.submit(run_all.run_one, retailer, path, self.path_config)
+            self.in_flight[future] = (retailer, path, self.hashes[retailer], previous)
+            logging.info(f"Queued {retailer}/{os.path.basename(path)}")
+
+    def collect(self, futures=None):
+        done = [f for f in (futures or list(self.in_flight)) if f.done()]
+        for future in done:
+            retailer, path, cfg_hash, previous = self.in_flight.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"status": "error", "error": f"{type(e).__name__}: {e}", "outputs": [], "seconds": None}
+
+            if not os.path.exists(path):
+                # Deleted while it was being parsed
+                self.mark_dirty(retailer, previous)
+                self.drop_source(retailer, path, result["outputs"])
+                continue
+
+            if result["status"] == "error":
+                self.manifest.forget(path)
+                self.failed[path] = (self.seen.get(path, (None,))[0], retailer)
+                logging.error(f"{retailer}/{os.path.basename(path)}: {result['error']}")
+                continue
+
+            self.failed.pop(path, None)
+            self.mark_dirty(retailer, previous | delivery_dates_of(result["outputs"]))
+            self.manifest.record(path, retailer, run_all.parser_version(retailer),
+                                 cfg_hash, result["outputs"], result.get("fingerprint"))
+            logging.info(f"[{result['status'].upper()}] {retailer}/{os.path.basename(path)} ({result['seconds']}s)")
+        if done:
+            self.manifest.save()
+
+    def drop_source(self, retailer, path, outputs):
+        """Remove a deleted input's rows and JSON and mark the days it contributed to."""
+        self.mark_dirty(retailer, source_dates(self.path_config, retailer, os.path.basename(path)))
+        delete_source(self.path_config, retailer, os.path.basename(path))
+        for output in outputs:
+            if not split_ref(output) and os.path.exists(output):
+                os.remove(output)
+        self.manifest.forget(path)
+        self.seen.pop(path, None)
+        self.failed.pop(path, None)
+        logging.info(f"Removed {retailer}/{os.path.basename(path)}: input deleted")
+
+    def drop_deleted(self):
+        queued = {os.path.normpath(path) for _, path, _, _ in self.in_flight.values()}
+        # Parsed inputs are in the manifest; ones whose last parse failed may still have rows from before
+        known = {key: (entry.get("retailer"), entry.get("outputs", [])) for key, entry in self.manifest.entries.items()}
+        known.update((path, (retailer, [])) for path, (_, retailer) in self.failed.items())
+        gone = [(path, retailer, outputs) for path, (retailer, outputs) in known.items()
+                if os.path.normpath(path) not in queued and not os.path.exists(path)]
+        for path, retailer, outputs in gone:
+            if retailer:
+                self.drop_source(retailer, path, outputs)
+            else:
+                self.manifest.forget(path)
+        if gone:
+            self.manifest.save()
+
+    def reconcile(self):
+        # Only the retailer/day pairs that just changed are re-joined, so a CHOT
+        # landing updates its picking list without recomputing the whole day
+        if not self.dirty_groups:
+            return
+        groups = sorted(self.dirty_groups)
+        self.dirty_groups.clear()
+        try:
+            updated = reconcile.update(self.path_config, groups)
+        except Exception as e:
+            logging.error(f"Reconciliation failed: {e}")
+            return
+        for (retailer, date), section in sorted(updated.items()):
+            logging.info(f"Picking list {date} {retailer}: {reconcile.summarise(section)}")
+
+    def flush(self):
+        self.reconcile()
+        if not self.dirty_dates:
+            return
+        dates = sorted(self.dirty_dates)
+        self.dirty_dates.clear()
+        try:
+            consolidate(self.path_config, dates=dates)
+        except Exception as e:
+            logging.error(f"Consolidation failed for {', '.join(dates)}: {e}")
+
+    def enforce_cutoff(self, retailer, deadline):
+        late = self.scan(datetime.now(), retailer=retailer, ignore_debounce=True)
+        self.submit(late)
+        outstanding = [f for f, (r, _, _, _) in self.in_flight.items() if r == retailer]
+        stragglers = set()
+        if outstanding:
+            _, stragglers = wait(outstanding, timeout=self.cutoff_wait)
+            self.collect(outstanding)
+        self.flush()
+        if late:
+            logging.warning(f"Cut-off {deadline:%H:%M} for {retailer}: {len(late)} files only picked up at the deadline")
+        if stragglers:
+            names = ", ".join(sorted(os.path.basename(self.in_flight[f][1]) for f in stragglers))
+            logging.warning(f"Cut-off {deadline:%H:%M} for {retailer}: still parsing after {self.cutoff_wait}s, "
+                            f"consolidated when done: {names}")
+        elif not late:
+            logging.info(f"Cut-off {deadline:%H:%M} for {retailer}: all received files consolidated")
+
+    def check_cutoffs(self, now):
+        for retailer, times in self.cutoffs.items():
+            for t in times:
+                deadline = cutoff_at(t, now.date())
+                if self.last_tick < deadline <= now:
+                    self.enforce_cutoff(retailer, deadline)
+
+    def tick(self):
+        now = datetime.now()
+        self.hashes = self.config_hashes()
+        self.collect()
+        self.drop_deleted()
+        self.submit(self.scan(now))
+        self.check_cutoffs(now)
+        self.flush()
+        self.last_tick = now
+
+    def run(self):
+        logging.info("Watching input folders (Ctrl+C to stop)")
+        try:
+            while True:
+                self.tick()
+                time.sleep(self.poll_interval)
+        except KeyboardInterrupt:
+            logging.info("Stopping watcher")
+        finally:
+            self.pool.shutdown(wait=True)
+            self.collect()
+            self.flush()
+            self.manifest.save()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parse orders as soon as they land in input/.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Number of warm worker processes (default: CPU count)")
+    parser.add_argument("--paths", default="config/paths.json", help="Path config file")
+    parser.add_argument("--cutoffs", default="config/cutoffs.json", help="Polling and cut-off settings")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    watcher = OrderWatcher(run_all.load_path_config(args.paths), load_cutoffs(args.cutoffs), args.workers)
+    watcher.run()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())